@@ -0,0 +1,179 @@
+import io
+import os
+import sys
+import json
+import math
+import argparse
+import resource
+import instance_store
+import utility_final
+import models
+import instrument
+import render
+
+"""
+Scaling benchmark for the routing pipelines. Every variant is run on the
+first N stops for each size N and the time spent in each phase is recorded:
+
+  load     - reading locations, cost matrix and demands
+  cluster  - splitting the stops into subsets
+  build    - building the Gurobi models
+  solve    - Gurobi's optimize()
+  extract  - turning solver values into routes
+  plot     - drawing the routes (to an in-memory PNG)
+
+plus the process' max RSS, the number of variables and constraints built, and
+the objective, bound and gap summed over the subsets. With --memory, each run
+is repeated with tracemalloc on (through instrument.py) for the peak Python
+memory per phase; the timings always come from the untraced run. Results are
+written as JSON. With --baseline, each run is compared against a stored run of
+the same variant and size; slower phases or worse objectives beyond
+--tolerance are reported as regressions (and the exit code is 1).
+
+    python benchmark.py --sizes 20 40 80 124 --time-limit 60 --out bench.json
+    python benchmark.py --baseline bench.json
+    python benchmark.py --sizes 20 40 --memory
+    python benchmark.py --data-dir data/synthetic_2000 --sizes 250 500 1000 2000
+
+--data-dir points at an instance written by synthetic.py.
+"""
+
+VARIANTS = ["three_index_clusters", "two_index_full", "kmeans_subsets"]
+TIME_PHASES = ["load", "cluster", "build", "solve", "extract", "plot"]
+Q = 12
+
+
+# Subsets and formulation for a variant
+def cluster(variant, locations, c, demands):
+    n = len(locations)
+    if variant == "three_index_clusters":
+        return utility_final.get_subsets3(locations, c, demands, max_demand=40, max_stops=10), "three_index"
+    if variant == "kmeans_subsets":
+        n_clusters = max(1, math.ceil((n - 1) / 30))
+        return utility_final.get_subsets2(locations, n_clusters), "two_index"
+    return [list(range(n + 1))], "two_index"
+
+
+def plot(routes, locations):
+    render.render_routes(routes, locations, io.BytesIO())
+
+
+# Run the pipeline of variant on the first n_stops stops inside instrument
+# stages. Returns the subsets, their solve_subset results and all routes.
+def pipeline(variant, n_stops, time_limit, data_dir, store_dir):
+    with instrument.stage("load"):
+        locations, c, _ = instance_store.load_instance(n_stops + 1, data_dir, store_dir)
+        demands = utility_final.get_demands(len(locations) + 1,
+                                            os.path.join(data_dir, "FBWMLocationsDemands.csv"), locations)
+    with instrument.stage("cluster"):
+        subsets, formulation = cluster(variant, locations, c, demands)
+
+    params = {"OutputFlag": 0, "TimeLimit": time_limit}
+    subtour = "lazy" if variant == "two_index_full" else "mtz"
+    # build, solve and extract are timed by solve_subset itself; the stage
+    # only measures their memory
+    with instrument.stage("subsets"):
+        results = [models.solve_subset(c, demands, subset, Q, formulation, params, subtour)
+                   for subset in subsets]
+    for result in results:
+        instrument.record_result(result)
+
+    routes = [route for r in results for route in (r["routes"] or [])]
+    with instrument.stage("plot"):
+        plot(routes, locations)
+    return subsets, results, routes
+
+
+# Run one variant on the first n_stops stops and return its record. The
+# phases are timed with tracemalloc off, since tracing slows allocation-heavy
+# phases down a lot. With memory, the pipeline is run a second time with
+# tracemalloc on (through instrument) for the peak memory of every phase.
+def run(variant, n_stops, time_limit, data_dir, store_dir, memory=False):
+    record = {"variant": variant, "n_stops": n_stops}
+    instrument.enable()
+    instrument.reset()
+    subsets, results, routes = pipeline(variant, n_stops, time_limit, data_dir, store_dir)
+    profile = instrument.report()
+    instrument.disable()
+    record["times"] = {phase: profile["stages"].get(phase, {}).get("seconds", 0.0)
+                       for phase in TIME_PHASES}
+    record["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    record["counters"] = profile["counters"]
+
+    if memory:
+        instrument.enable(memory=True)
+        instrument.reset()
+        pipeline(variant, n_stops, time_limit, data_dir, store_dir)
+        traced = instrument.report()
+        instrument.disable()
+        record["peak_mb"] = {phase: entry["peak_mb"] for phase, entry in traced["stages"].items()
+                             if "peak_mb" in entry}
+        record["peak_python_mb"] = traced["peak_mb"]
+
+    record["subsets"] = [len(s) - 2 for s in subsets]
+    solved = all(r["objective"] is not None for r in results)
+    record["objective"] = sum(r["objective"] for r in results) if solved else None
+    record["bound"] = sum(r["bound"] for r in results)
+    record["gap"] = (record["objective"] - record["bound"]) / record["objective"] if solved else None
+    record["routes"] = len(routes)
+    return record
+
+
+# Regressions of record against the baseline record of the same variant and
+# size: phases that got slower and objectives that got worse by more than
+# tolerance (relative). Phases under min_seconds are ignored as noise.
+def compare(record, baseline, tolerance, min_seconds=0.05):
+    problems = []
+    for phase in TIME_PHASES:
+        new, old = record["times"][phase], baseline["times"][phase]
+        if new > min_seconds and new > old * (1 + tolerance):
+            problems.append(f"{phase} {old:.3f}s -> {new:.3f}s")
+    if baseline["objective"] is not None:
+        if record["objective"] is None:
+            problems.append("no solution (baseline had one)")
+        elif record["objective"] > baseline["objective"] * (1 + tolerance):
+            problems.append(f"objective {baseline['objective']:.0f} -> {record['objective']:.0f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routing pipelines")
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[20, 40, 80, 124])
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--data-dir", default=instance_store.DATA_DIR)
+    parser.add_argument("--store-dir", help="defaults to the store directory in --data-dir")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--memory", action="store_true",
+                        help="also measure peak memory per phase (in a second, traced run)")
+    args = parser.parse_args()
+    store_dir = args.store_dir or os.path.join(args.data_dir, "store")
+
+    records = []
+    for n_stops in args.sizes:
+        for variant in args.variants:
+            record = run(variant, n_stops, args.time_limit, args.data_dir, store_dir, args.memory)
+            records.append(record)
+            phases = " ".join(f"{p}={record['times'][p]:.2f}s" for p in TIME_PHASES)
+            print(f"{variant} n={n_stops}: {phases} obj={record['objective']} gap={record['gap']}")
+    with open(args.out, "w") as f:
+        json.dump(records, f, indent=2)
+
+    if args.baseline:
+        baseline = {(r["variant"], r["n_stops"]): r for r in json.load(open(args.baseline))}
+        regressions = 0
+        for record in records:
+            old = baseline.get((record["variant"], record["n_stops"]))
+            if old is None:
+                continue
+            for problem in compare(record, old, args.tolerance):
+                print(f"REGRESSION {record['variant']} n={record['n_stops']}: {problem}")
+                regressions += 1
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
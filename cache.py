@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import instance_store
+
+"""
+On-disk memoization of per-subset solves. A solved subset is stored under a
+hash of everything its solution depends on: the location ids, the travel
+times between them, their demands, Q and the solver options. When we re-plan
+after a few demands change, only the clusters whose inputs changed miss the
+cache; every other cluster replays its stored routes, objective, bound and
+gap instantly.
+
+Entries are JSON files in CACHE_DIR. Entries older than max_age seconds are
+dropped, and the least recently used ones are evicted once the directory
+grows beyond max_bytes.
+"""
+
+CACHE_DIR = os.path.join("data", "cache")
+
+
+# Hash of the inputs of one subset solve. The stops are put in sorted order
+# (depots stay first and last), so the same cluster always gets the same key.
+def subset_key(c, demands, subset, Q, options=None):
+    ids = [subset[0]] + sorted(subset[1:-1]) + [subset[-1]]
+    h = hashlib.sha256()
+    h.update(json.dumps(ids).encode())
+    h.update(instance_store.submatrix(c, ids).astype(np.float64).tobytes())
+    h.update(np.array([demands[i] for i in ids], dtype=np.float64).tobytes())
+    h.update(json.dumps({"Q": Q, "options": options or {}}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class SubsetCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=64 * 2**20, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    # Stored result for key, or None. A hit counts as a use for eviction.
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, "r") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return result
+
+    # Store result under key (written to a temp file and renamed, so a
+    # reader never sees half an entry), then evict if needed
+    def put(self, key, result):
+        path = self.path(key)
+        tmp = path + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f, default=float)
+        os.replace(tmp, path)
+        self.evict()
+
+    # Drop expired entries, then least recently used ones until the cache
+    # fits in max_bytes
+    def evict(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                os.remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
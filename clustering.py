@@ -1,10 +1,10 @@
-import os, json, csv
+import csv
+import instance_store
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 
 N = 8
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"] != "Pick-up"] # 125 locations
+locations, costs, _ = instance_store.load_instance() # 125 locations
 x = [(loc["long"], loc["lat"]) for loc in locations]
 x = x[1:] # don't fit the depot
 
@@ -17,7 +17,6 @@ clusters = {"long": [xy[0] for xy in x], "lat": [xy[1] for xy in x], "clusters":
 #plt.axis('equal')
 #plt.show()
 
-costs = json.load(open(os.path.abspath("./data/travel_times_matrix.json"), "r"))
 demands = [0]
 with open("data/FBWMLocationsDemands.csv") as csv_file:
     csv_reader = csv.reader(csv_file, delimiter=',')
@@ -35,22 +34,14 @@ demands.append(0)
 
 clusters = clusters["clusters"]
 locs_0 = [locations[0]]
-costs_0 = [costs[0]]
+ids_0 = [0]
 dems_0 = [0]
 for i, cluster in enumerate(clusters):
     if cluster == 0:
         locs_0.append(locations[i+1])
-        costs_0.append(costs[i+1])
+        ids_0.append(i+1)
         dems_0.append(demands[i+1])
 dems_0.append(0)
+ids_0.append(len(locations))  # D, the depot again
 
-for i, cs in enumerate(costs_0[:len(locations)+1]):
-    new_cs = []
-    for j, cost in enumerate(cs):
-        if j == len(locations):
-            new_cs.append(new_cs[0])
-            break
-        elif clusters[j] == 0:
-            new_cs.append(cost)
-    costs_0[i] = new_cs
-costs_0.append(costs_0[0])
\ No newline at end of file
+costs_0 = instance_store.submatrix(costs, ids_0).tolist()
\ No newline at end of file
@@ -1,12 +1,11 @@
-import os, json
+import instance_store
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 
 
 
 N = 8
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"] != "Pick-up"] # 125 locations
+locations, _, _ = instance_store.load_instance() # 125 locations
 x = [(loc["long"], loc["lat"]) for loc in locations]
 x = x[1:] # don't fit the depot
 
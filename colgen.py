@@ -0,0 +1,165 @@
+import time
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+import heuristics
+
+"""
+Route-based (set-partitioning) solver. With Q = 12 pallets and demands of 1
+to 10 a truck only serves a handful of stops, and the LP relaxations of the
+arc models (two- and three-index, MTZ) are weak for such short routes. Here a
+variable is a whole feasible route r, with cost c_r:
+
+    min  sum_r c_r l_r
+    s.t. sum_{r visits i} l_r = 1     for every stop i
+         l_r in {0, 1}
+
+Column generation solves the LP relaxation over a growing set of routes. The
+master LP starts from single-stop routes plus the savings + local search
+routes. Its duals p_i price the stops, and a labeling algorithm on the travel
+times searches for elementary routes with load <= Q and negative reduced cost
+c_r - sum_{i in r} p_i (an ESPPRC). The new routes are added and the LP is
+solved again until pricing finds nothing. The final answer is the MIP over
+every route generated (a restricted master, so it is a heuristic unless the
+LP bound closes the gap), polished with heuristics.improve_routes.
+
+Pricing keeps the max_labels cheapest labels per location and route length,
+which makes it a heuristic. With max_labels=None it is exact, and the LP value
+is then a valid lower bound.
+"""
+
+
+# Reduced-cost routes from O (local 0) to D (local n-1) as (reduced cost,
+# route) pairs, most negative first. All labels (partial routes from O) of one
+# length are extended to every stop at once with array operations. At each
+# stop the cheapest extensions are kept (at most max_labels, picked from the
+# 3 * max_labels cheapest; None keeps all), skipping any label dominated by a
+# kept one: no less load, no less reduced cost and a superset of its stops.
+def price_routes(cs, ds, Q, duals, max_labels=30, max_columns=50, eps=1e-6):
+    n = len(ds)
+    D = n-1
+    red = cs - duals[None, :]
+    stop_mask = np.zeros(n, dtype=bool)
+    stop_mask[1:D] = True
+
+    found = {}
+    node = np.array([0])
+    cost = np.array([0.0])
+    load = np.array([0.0])
+    visited = np.zeros((1, n), dtype=bool)
+    paths = [(0,)]
+    while len(node):
+        closing = cost + red[node, D]
+        for l in np.flatnonzero((closing < -eps) & (node != 0)):
+            found[paths[l] + (D,)] = closing[l]
+
+        ok = stop_mask[None, :] & ~visited & (ds[None, :] <= Q - load[:, None] + 1e-9)
+        new_cost = np.where(ok, cost[:, None] + red[node], np.inf)
+        parents, targets = [], []
+        for j in np.flatnonzero(ok.any(axis=0)):
+            cand = np.flatnonzero(ok[:, j])
+            if max_labels is not None and len(cand) > 3 * max_labels:
+                # dominance can drop some, so look a bit past the cheapest
+                cand = cand[np.argpartition(new_cost[cand, j], 3 * max_labels)[:3 * max_labels]]
+            cand = cand[np.argsort(new_cost[cand, j], kind="stable")]
+            # a dominates b if it comes first (costs no more), has no more
+            # load and visited no stop b didn't
+            V = visited[cand].astype(np.float32)
+            dominates = ((V @ (1 - V).T) == 0) & (load[cand][:, None] <= load[cand][None, :])
+            kept = cand[~np.triu(dominates, k=1).any(axis=0)][:max_labels].tolist()
+            parents += kept
+            targets += [j] * len(kept)
+        parents = np.array(parents, dtype=np.intp)
+        targets = np.array(targets, dtype=np.intp)
+        cost = new_cost[parents, targets]
+        load = load[parents] + ds[targets]
+        visited = visited[parents]
+        visited[np.arange(len(targets)), targets] = True
+        paths = [paths[l] + (int(j),) for l, j in zip(parents, targets)]
+        node = targets
+
+    columns = sorted(((rc, list(path)) for path, rc in found.items()), key=lambda col: col[0])
+    return columns[:max_columns]
+
+
+# Column generation + restricted master MIP over subset (all locations if
+# None). params are Gurobi parameters for the master problems; their
+# TimeLimit also bounds the column generation loop. Returns the same dict as
+# models.solve_subset (routes as global ids), plus the number of columns and
+# pricing rounds and proven. bound is the LP value when pricing was exact
+# (proven), else 0 (the travel times are not negative, so that is the only
+# bound known).
+def solve_subset(c, demands, Q, subset=None, params=None, max_iter=200,
+                 max_labels=30, max_columns=50):
+    start_time = time.perf_counter()
+    cs, ds, subset = heuristics.local_arrays(c, demands, subset)
+    n = len(subset)
+    D = n-1
+    params = dict(params or {})
+    time_limit = params.get("TimeLimit", GRB.INFINITY)
+
+    m = gp.Model()
+    for name, value in params.items():
+        m.setParam(name, value)
+    covers = {i: m.addConstr(gp.LinExpr() == 1, name=f"cover[{i}]") for i in range(1, D)}
+    columns = []
+    seen = set()
+
+    def add_column(route):
+        key = tuple(route)
+        if key in seen or len(route) < 3:
+            return False
+        seen.add(key)
+        columns.append(route)
+        m.addVar(obj=heuristics.routes_cost([route], cs), lb=0, column=gp.Column([1.0] * (len(route) - 2),
+                                                                  [covers[i] for i in route[1:-1]]))
+        return True
+
+    local = {loc: i for i, loc in enumerate(subset)}
+    for i in range(1, D):
+        add_column([0, i, D])
+    for route in heuristics.solve(c, demands, Q, subset):
+        add_column([local[i] for i in route])
+    build_time = time.perf_counter() - start_time
+
+    # column generation on the LP relaxation
+    iterations = 0
+    proven = False
+    lp_value = None
+    while iterations < max_iter and time.perf_counter() - start_time < time_limit:
+        iterations += 1
+        m.optimize()
+        lp_value = m.ObjVal
+        duals = np.zeros(n)
+        duals[1:D] = [covers[i].Pi for i in range(1, D)]
+        new = [route for _, route in price_routes(cs, ds, Q, duals, max_labels, max_columns)
+               if add_column(route)]
+        if not new:
+            proven = max_labels is None
+            break
+
+    # restricted master MIP over every route generated
+    variables = m.getVars()
+    m.setAttr("VType", variables, [GRB.BINARY] * len(variables))
+    if time_limit != GRB.INFINITY:
+        m.setParam("TimeLimit", max(1.0, time_limit - (time.perf_counter() - start_time)))
+    m.optimize()
+
+    result = {"subset": list(subset), "routes": None, "objective": None,
+              "bound": lp_value if proven else 0.0, "gap": None,
+              "runtime": time.perf_counter() - start_time, "build_time": build_time,
+              "extract_time": 0.0, "variables": len(variables), "constraints": len(covers),
+              "columns": len(columns), "iterations": iterations, "proven": proven}
+    if m.SolCount > 0:
+        values = m.getAttr("X", variables)
+        routes = [columns[r] for r, value in enumerate(values) if value > 0.5]
+        # the master only recombines routes it has seen; local search can
+        # still move stops between them
+        routes = heuristics.improve_routes(routes, cs, ds, Q)
+        result["routes"] = [[subset[i] for i in route] for route in routes]
+        result["objective"] = min(m.ObjVal, heuristics.routes_cost(routes, cs))
+        if result["objective"] > 0:
+            result["gap"] = max(0.0, (result["objective"] - result["bound"]) / result["objective"])
+        else:
+            result["gap"] = 0.0
+    return result
@@ -0,0 +1,45 @@
+import time
+import utility_final as utility
+import instance_store
+import heuristics
+import instrument
+
+"""
+Solver-free version of integer_program_4.py. Instead of a Gurobi solve it
+builds routes with the Clarke-Wright savings heuristic and improves them
+with local search (relocate, or-opt, swap and 2-opt, see heuristics.py).
+No solver license is needed and all 124 drop-off locations are routed in
+seconds. The routes are not proven optimal.
+"""
+
+# Acquire locations data and the cost matrix (travel times in seconds)
+with instrument.stage("load"):
+    locations, c, _ = instance_store.load_instance()
+
+# Declare Constants
+N_LOCS = len(locations) + 1 # N_LOCS = start depot + drop-off locations + end depot
+O = 0 # the start (depot)
+D = N_LOCS-1 # the end (depot)
+Q = 12 # number of pallets a truck can hold
+# e.g. "routes.png" to write the plots (the 4 groups to groups_routes.png)
+# instead of showing them
+PLOT_FILE = None
+
+# Demands matrix
+# demands[i] is the required pallets of location i (0 for the depot)
+with instrument.stage("load"):
+    demands = utility.get_demands(N_LOCS)
+
+start = time.time()
+with instrument.stage("solve"):
+    routes = heuristics.solve(c, demands, Q)
+cs, _, _ = heuristics.local_arrays(c, demands)
+print(f"Found {len(routes)} routes with total cost {heuristics.routes_cost(routes, cs):.0f} in {time.time() - start:.2f}s")
+
+# RESULTS
+print(",\n".join(str(route) for route in routes))
+with instrument.stage("plot"):
+    utility.plot_all_routes(routes, locations, PLOT_FILE)
+    utility.plot_4_groups_of_routes(routes, locations, PLOT_FILE and "groups_" + PLOT_FILE)
+utility.print_routes(routes, demands)
+instrument.write_report()
@@ -0,0 +1,326 @@
+import numpy as np
+import instance_store
+
+"""
+Heuristics that work directly on the travel-time matrix, without a solver.
+They take the same inputs as the integer programs (cost matrix c, demands, Q
+and optionally a subset [O, ..., D] of global location ids) and return routes
+in the same format build_routes does: lists [O, stop, ..., D] of global ids.
+"""
+
+
+# Cost matrix and demands over a subset (every location if subset is None),
+# as NumPy arrays. Returns the subset too, so callers can map back.
+def local_arrays(c, demands, subset=None):
+    if subset is None:
+        subset = list(range(len(demands)))
+    cs = instance_store.submatrix(c, subset).astype(np.float64)
+    ds = np.asarray([demands[i] for i in subset], dtype=np.float64)
+    return cs, ds, list(subset)
+
+
+# Total travel time of routes given in the indices of cs
+def routes_cost(routes, cs):
+    return float(sum(cs[route[:-1], route[1:]].sum() for route in map(np.asarray, routes)))
+
+
+# Clarke-Wright (parallel) savings construction. Every stop starts on its own
+# O -> i -> D route; routes ending at i and starting at j are then joined in
+# order of decreasing saving c[i,D] + c[O,j] - c[i,j] as long as the joined
+# route carries at most Q pallets. Works for asymmetric matrices.
+def savings_routes(c, demands, Q, subset=None):
+    cs, ds, subset = local_arrays(c, demands, subset)
+    n = len(subset)
+    O = 0
+    D = n-1
+    stops = np.arange(1, D)
+    if len(stops) == 0:
+        return []
+
+    # savings for every ordered pair of stops (i last of one route, j first of the next)
+    savings = cs[stops, D][:, None] + cs[O, stops][None, :] - cs[np.ix_(stops, stops)]
+    np.fill_diagonal(savings, -np.inf)
+    pairs = np.argsort(savings, axis=None)[::-1]
+    count = int(np.sum(savings > 0))
+
+    # route bookkeeping: next stop, route id (as its first stop), last stop and load
+    succ = {int(i): D for i in stops}
+    head = {int(i): int(i) for i in stops}
+    tail = {int(i): int(i) for i in stops}
+    load = {int(i): ds[i] for i in stops}
+    for p in pairs[:count]:
+        i = int(stops[p // len(stops)])
+        j = int(stops[p % len(stops)])
+        ri, rj = head[i], head[j]
+        if ri == rj or tail[ri] != i or rj != j:
+            continue
+        if load[ri] + load[rj] > Q:
+            continue
+        succ[i] = j
+        tail[ri] = tail[rj]
+        load[ri] += load.pop(rj)
+        v = j
+        while v != D:
+            head[v] = ri
+            v = succ[v]
+
+    routes = []
+    for first in sorted(load):
+        route = [O, first]
+        while route[-1] != D:
+            route.append(succ[route[-1]])
+        routes.append([subset[i] for i in route])
+    return routes
+
+
+# Arrays describing a solution (routes in the indices of cs): for every stop
+# its route, its predecessor and its successor; plus the load of every route
+# and every arc (a, b) used, with the route it belongs to.
+def solution_arrays(routes, ds, n):
+    route_of = np.full(n, -1)
+    prev = np.zeros(n, dtype=np.intp)
+    succ = np.zeros(n, dtype=np.intp)
+    tails, heads, arc_route = [], [], []
+    for r, route in enumerate(routes):
+        route_of[route[1:-1]] = r
+        prev[route[1:-1]] = route[:-2]
+        succ[route[1:-1]] = route[2:]
+        tails += route[:-1]
+        heads += route[1:]
+        arc_route += [r] * (len(route) - 1)
+    loads = np.array([ds[route].sum() for route in routes])
+    return route_of, prev, succ, np.array(tails), np.array(heads), np.array(arc_route), loads
+
+
+# Best relocate / or-opt move: take a chain of 1 to 3 consecutive stops out of
+# its route and insert it, in the same direction, between any other pair of
+# consecutive locations. All insertion points are scored at once.
+# Returns (delta, route, start, length, target arc) or None.
+def best_relocate(routes, cs, ds, Q, arrays, max_chain=3):
+    route_of, prev, succ, tails, heads, arc_route, loads = arrays
+    insert_base = -cs[tails, heads]
+    best = None
+    for r, route in enumerate(routes):
+        own = arc_route == r
+        own_pos = np.cumsum(own) - 1
+        for p in range(1, len(route) - 1):
+            for L in range(1, max_chain + 1):
+                if p + L > len(route) - 1:
+                    break
+                first, last = route[p], route[p + L - 1]
+                before, after = route[p - 1], route[p + L]
+                chain_load = ds[route[p:p + L]].sum()
+                gain = cs[before, first] + cs[last, after]
+                if len(route) - L > 2:
+                    gain -= cs[before, after]  # otherwise the route is dropped
+                delta = cs[tails, first] + cs[last, heads] + insert_base - gain
+                # arcs touching the chain (in its own route) are not insertion points
+                blocked = own & (own_pos >= p - 1) & (own_pos <= p + L - 1)
+                full = (arc_route != r) & (loads[arc_route] + chain_load > Q)
+                delta[blocked | full] = np.inf
+                a = int(np.argmin(delta))
+                if best is None or delta[a] < best[0]:
+                    best = (delta[a], r, p, L, a)
+    return best
+
+
+# Best swap of two stops on different routes, scored against every other
+# stop at once. Returns (delta, v, w) or None.
+def best_swap(routes, cs, ds, Q, arrays):
+    route_of, prev, succ, tails, heads, arc_route, loads = arrays
+    stops = np.flatnonzero(route_of >= 0)
+    if len(stops) < 2:
+        return None
+    P, S, R = prev[stops], succ[stops], route_of[stops]
+    removed = cs[P, stops] + cs[stops, S]
+    best = None
+    for v in stops:
+        pv, sv, rv = prev[v], succ[v], route_of[v]
+        delta = (cs[pv, stops] + cs[stops, sv] - cs[pv, v] - cs[v, sv]
+                 + cs[P, v] + cs[v, S] - removed)
+        feasible = ((R != rv) & (loads[rv] - ds[v] + ds[stops] <= Q)
+                    & (loads[R] - ds[stops] + ds[v] <= Q))
+        delta[~feasible] = np.inf
+        w = int(np.argmin(delta))
+        if best is None or delta[w] < best[0]:
+            best = (delta[w], int(v), int(stops[w]))
+    return best
+
+
+# Best merge of two whole routes: route a's stops followed by route b's, one
+# truck instead of two, if their loads fit in Q. Saves c[last of a, D] +
+# c[O, first of b] - c[last of a, first of b]. Returns (delta, a, b) or None.
+def best_merge(routes, cs, ds, Q, arrays):
+    loads = arrays[6]
+    if len(routes) < 2:
+        return None
+    first = np.array([route[1] for route in routes])
+    last = np.array([route[-2] for route in routes])
+    O, D = routes[0][0], routes[0][-1]
+    delta = cs[last[:, None], first[None, :]] - cs[last, D][:, None] - cs[O, first][None, :]
+    delta[loads[:, None] + loads[None, :] > Q] = np.inf
+    np.fill_diagonal(delta, np.inf)
+    a, b = np.unravel_index(np.argmin(delta), delta.shape)
+    return (delta[a, b], int(a), int(b))
+
+
+# Best 2-opt move inside one route: reverse the stops between positions i and
+# j. The matrix can be asymmetric, so the cost of the reversed chain is taken
+# from prefix sums of the backward arcs. Returns (delta, route, i, j) or None.
+def best_two_opt(routes, cs):
+    best = None
+    for r, route in enumerate(routes):
+        if len(route) < 4:
+            continue
+        route = np.asarray(route)
+        fwd = np.concatenate(([0], np.cumsum(cs[route[:-1], route[1:]])))
+        bwd = np.concatenate(([0], np.cumsum(cs[route[1:], route[:-1]])))
+        i, j = np.triu_indices(len(route) - 2, k=1)
+        i, j = i + 1, j + 1
+        delta = (cs[route[i - 1], route[j]] + cs[route[i], route[j + 1]]
+                 - cs[route[i - 1], route[i]] - cs[route[j], route[j + 1]]
+                 + (bwd[j] - bwd[i]) - (fwd[j] - fwd[i]))
+        a = int(np.argmin(delta))
+        if best is None or delta[a] < best[0]:
+            best = (delta[a], r, int(i[a]), int(j[a]))
+    return best
+
+
+# Improve routes (indices of cs, [O, ..., D]) with relocate, or-opt, swap,
+# 2-opt and route merge moves until none of them lowers the total travel
+# time. Each round applies the best move found over all neighborhoods.
+def improve_routes(routes, cs, ds, Q, max_rounds=10000, eps=1e-9):
+    routes = [list(route) for route in routes]
+    n = len(ds)
+    for _ in range(max_rounds):
+        arrays = solution_arrays(routes, ds, n)
+        moves = [("relocate", best_relocate(routes, cs, ds, Q, arrays)),
+                 ("swap", best_swap(routes, cs, ds, Q, arrays)),
+                 ("two_opt", best_two_opt(routes, cs)),
+                 ("merge", best_merge(routes, cs, ds, Q, arrays))]
+        moves = [(move[0], kind, move) for kind, move in moves if move is not None]
+        if not moves:
+            break
+        delta, kind, move = min(moves, key=lambda m: m[0])
+        if delta >= -eps:
+            break
+
+        if kind == "relocate":
+            _, r, p, L, a = move
+            chain = routes[r][p:p + L]
+            del routes[r][p:p + L]
+            target = routes[arrays[5][a]]
+            tail = arrays[3][a]
+            # the arc is (tail, head); tail is unique within its route
+            at = target.index(tail) + 1
+            target[at:at] = chain
+        elif kind == "swap":
+            _, v, w = move
+            rv, rw = routes[arrays[0][v]], routes[arrays[0][w]]
+            iv, iw = rv.index(v), rw.index(w)
+            rv[iv], rw[iw] = w, v
+        elif kind == "merge":
+            _, a, b = move
+            routes[a] = routes[a][:-1] + routes[b][1:]
+            routes[b] = routes[b][:1] + routes[b][-1:]
+        else:
+            _, r, i, j = move
+            routes[r][i:j + 1] = routes[r][i:j + 1][::-1]
+        routes = [route for route in routes if len(route) > 2]
+    return routes
+
+
+# Cheapest order of stops (indices of cs) on a route from O to D, exactly,
+# by the Held-Karp dynamic program: best[S, j] is the cheapest path from O
+# through the stops in bitmask S ending at stop j. All subsets of one size
+# are extended to each j at once with array operations. 2^n * n entries, so
+# keep n to about 12 (no route can carry more stops at Q = 12). Returns
+# (cost, order).
+def held_karp(cs, O, D, stops):
+    stops = np.asarray(stops, dtype=np.intp)
+    n = len(stops)
+    if n == 0:
+        return float(cs[O, D]), []
+    t = cs[np.ix_(stops, stops)]
+    masks = np.arange(1 << n)
+    sizes = np.zeros(1 << n, dtype=np.intp)
+    for j in range(n):
+        sizes += (masks >> j) & 1
+    best = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.intp)
+    best[1 << np.arange(n), np.arange(n)] = cs[O, stops]
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for j in range(n):
+            S = layer[(layer >> j) & 1 == 1]
+            # best[S without j, k] is inf for the k not in it (and for k = j)
+            totals = best[S ^ (1 << j)] + t[:, j][None, :]
+            k = totals.argmin(axis=1)
+            best[S, j] = totals[np.arange(len(S)), k]
+            parent[S, j] = k
+    full = (1 << n) - 1
+    totals = best[full] + cs[stops, D]
+    j = int(totals.argmin())
+    cost = float(totals[j])
+    order = []
+    mask = full
+    while j >= 0:
+        order.append(int(stops[j]))
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return cost, order[::-1]
+
+
+# Best stop orders found so far, by stop set and the travel times between
+# them, so the same route coming out of several solves is only solved once
+_best_orders = {}
+
+
+# Re-sequence every route (indices of c, [O, ..., D]) in its cheapest order
+# with held_karp. The stops on a route don't change, so loads stay the same;
+# only routes the MIP (e.g. stopped on a time limit) left in a worse order
+# change. Routes with more than max_stops stops are kept as they are.
+def resequence(routes, c, max_stops=12, eps=1e-9):
+    resequenced = []
+    for route in routes:
+        stops = sorted(route[1:-1])
+        if len(stops) < 3 or len(stops) > max_stops:
+            resequenced.append(list(route))
+            continue
+        ids = [route[0]] + stops + [route[-1]]
+        sub = instance_store.submatrix(c, ids).astype(np.float64)
+        key = (tuple(ids), sub.tobytes())
+        if key not in _best_orders:
+            cost, order = held_karp(sub, 0, len(ids) - 1, range(1, len(ids) - 1))
+            _best_orders[key] = (cost, [ids[i] for i in order])
+        cost, order = _best_orders[key]
+        position = {loc: p for p, loc in enumerate(ids)}
+        current = float(sum(sub[position[i], position[j]] for i, j in zip(route[:-1], route[1:])))
+        if cost < current - eps:
+            resequenced.append([route[0]] + order + [route[-1]])
+        else:
+            resequenced.append(list(route))
+    return resequenced
+
+
+# Solver-free CVRP: Clarke-Wright savings followed by local search. Takes the
+# same inputs as the integer programs and returns routes as global ids.
+def solve(c, demands, Q, subset=None):
+    cs, ds, subset = local_arrays(c, demands, subset)
+    local = {loc: i for i, loc in enumerate(subset)}
+    start = [[local[i] for i in route] for route in savings_routes(c, demands, Q, subset)]
+    routes = improve_routes(start, cs, ds, Q)
+    return [[subset[i] for i in route] for route in routes]
+
+
+# Consolidate the routes of a decomposed solve (global ids, e.g. every
+# cluster's routes put together). Clusters are solved on their own, so stops
+# near a cluster boundary can't share a truck and the plan ends up with many
+# short routes. improve_routes runs over all routes at once, merging routes
+# and moving and exchanging stops across cluster boundaries whenever that
+# fits in Q and saves time. Returns the new routes and (routes, cost) before
+# and after.
+def consolidate(routes, c, demands, Q):
+    cs, ds, _ = local_arrays(c, demands)
+    before = (len(routes), routes_cost(routes, cs))
+    routes = improve_routes(routes, cs, ds, Q)
+    return routes, before, (len(routes), routes_cost(routes, cs))
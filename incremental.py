@@ -0,0 +1,61 @@
+import numpy as np
+import instance_store
+import heuristics
+import models
+import presolve
+
+"""
+Incremental re-planning. Demands change a few stops at a time, so instead of
+re-solving everything we start from the previous routes (lists [O, ..., D]
+of global ids, like the ones in oops.py) and a delta:
+
+  added   - stops that now need a delivery
+  removed - stops that no longer do
+  changed - stops whose demand changed (demands holds the new values)
+
+Only the routes touched by the delta are re-solved: the routes of removed
+and changed stops, plus for every added stop the routes it is cheapest to
+insert it into. Their stops and the added stops form one small subset that
+is solved with the two-index model (or the heuristic), warm-started from the
+old routes patched up with the delta. Every other route is kept as it was,
+so re-planning time scales with the size of the change.
+"""
+
+
+# Cheapest way to insert stop into each route (extra travel time), as an
+# array. Only the travel times along the routes and to and from stop are read.
+def insertion_costs(routes, stop, c):
+    tails = np.concatenate([route[:-1] for route in routes])
+    heads = np.concatenate([route[1:] for route in routes])
+    extra = (instance_store.entries(c, tails, stop) + instance_store.entries(c, stop, heads)
+             - instance_store.entries(c, tails, heads))
+    starts = np.cumsum([0] + [len(route) - 1 for route in routes[:-1]])
+    return np.minimum.reduceat(extra, starts)
+
+
+# Patch the old routes with the delta so they can serve as a warm start:
+# removed stops are dropped, added stops go where they cost least among the
+# routes with room (or on a route of their own), and routes that now carry
+# more than Q are cut into pieces that fit.
+def patch_routes(routes, c, demands, Q, added=(), removed=()):
+    removed = set(removed)
+    O, D = routes[0][0], routes[0][-1]
+    routes = [[i for i in route if i not in removed] for route in routes]
+    routes = [route for route in routes if len(route) > 2]
+    for stop in added:
+        best = None
+        for r, route in enumerate(routes):
+            if sum(demands[i] for i in route) + demands[stop] > Q:
+                continue
+            extra = (instance_store.entries(c, route[:-1], stop)
+                     + instance_store.entries(c, stop, route[1:])
+                     - instance_store.entries(c, route[:-1], route[1:]))
+            p = int(np.argmin(extra))
+            if best is None or extra[p] < best[0]:
+                best = (extra[p], r, p)
+        if best is None:
+            routes.append([O, stop, D])
+        else:
+            routes[best[1]].insert(best[2] + 1, stop)
+
+    return presolve.split_routes(routes, ds=demands, Q=Q)
@@ -0,0 +1,172 @@
+import os
+import json
+import numpy as np
+
+"""
+Binary instance store. The JSON matrices are 137x134 nested lists that every
+script parses and then patches row by row so that the end depot D has the same
+costs as the start depot O. convert_instance() does that work once: it keeps
+only the drop-off locations (no "Pick-up" rows/cols) and writes the matrices
+and the locations as fixed-width NumPy arrays. load_instance() memory-maps the
+arrays, so loading is instant and processes that open the same file share its
+pages.
+
+Integer programs index locations as 0 (O), 1..n-1 (drop-offs) and n (D). The
+CostMatrix class below maps those model indices onto the stored rows without
+copying, with D pointing back at the depot's row and column.
+"""
+
+DATA_DIR = "data"
+STORE_DIR = os.path.join(DATA_DIR, "store")
+
+TRAVEL_TIMES_FILE = "travel_times.npy"
+DISTANCES_FILE = "distances.npy"
+LOCATIONS_FILE = "locations.npy"
+
+# Fixed-width record for one location. Strings are truncated to the widths
+# below, which covers every location we have.
+LOCATION_DTYPE = np.dtype([
+    ("loc_id", np.float64),
+    ("title", "U80"),
+    ("type", "U24"),
+    ("street1", "U64"),
+    ("city", "U32"),
+    ("zip", "U10"),
+    ("state", "U4"),
+    ("long", np.float64),
+    ("lat", np.float64),
+])
+
+
+# Convert the JSON instance in data_dir into .npy files in store_dir.
+# Only drop-off locations (and the warehouse) are kept, in file order.
+def convert_instance(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    locations = json.load(open(os.path.join(data_dir, "locations.json"), "r"))
+    keep = [i for i, loc in enumerate(locations) if loc["type"] != "Pick-up"]
+
+    records = np.zeros(len(keep), dtype=LOCATION_DTYPE)
+    for r, i in enumerate(keep):
+        records[r] = tuple(locations[i].get(name, "") for name in LOCATION_DTYPE.names)
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, LOCATIONS_FILE), records)
+    for src, dst in (("travel_times_matrix.json", TRAVEL_TIMES_FILE),
+                     ("distances_matrix.json", DISTANCES_FILE)):
+        matrix = np.asarray(json.load(open(os.path.join(data_dir, src), "r")), dtype=np.int32)
+        np.save(os.path.join(store_dir, dst), np.ascontiguousarray(matrix[np.ix_(keep, keep)]))
+
+
+# True if the store is missing or older than any of the JSON files. A store
+# without JSON files next to it (see synthetic.py --no-json) is never stale.
+def store_is_stale(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    stored = [os.path.join(store_dir, f) for f in (LOCATIONS_FILE, TRAVEL_TIMES_FILE, DISTANCES_FILE)]
+    if not all(os.path.exists(f) for f in stored):
+        return True
+    sources = [os.path.join(data_dir, f) for f in
+               ("locations.json", "travel_times_matrix.json", "distances_matrix.json")]
+    newest_source = max((os.path.getmtime(f) for f in sources if os.path.exists(f)), default=0)
+    return min(os.path.getmtime(f) for f in stored) < newest_source
+
+
+def _reopen(filename, ids):
+    return CostMatrix(np.load(filename, mmap_mode="r"), ids)
+
+
+# A square matrix over model indices backed by a memory-mapped array. ids[i]
+# is the stored row/col of model index i, so duplicating the depot as D is
+# just an extra entry in ids. c[i][j] and c[i, j] both work, which keeps the
+# existing list-of-lists code running unchanged.
+class CostMatrix:
+    def __init__(self, base, ids):
+        self.base = base
+        self.ids = np.asarray(ids, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def shape(self):
+        return (len(self.ids), len(self.ids))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            return self.base[self.ids[i], self.ids[j]].item()
+        return _Row(self.base[self.ids[key]], self.ids)
+
+    # Restrict to the model indices in local (e.g. a K-Means subset)
+    def sub(self, local):
+        return CostMatrix(self.base, self.ids[np.asarray(local, dtype=np.intp)])
+
+    def toarray(self):
+        return self.base[np.ix_(self.ids, self.ids)]
+
+    def __array__(self, dtype=None, copy=None):
+        a = self.toarray()
+        return a if dtype is None else a.astype(dtype)
+
+    # Workers get a handle on the same file instead of a pickled copy
+    def __reduce__(self):
+        filename = getattr(self.base, "filename", None)
+        if filename is None:
+            return (CostMatrix, (np.asarray(self.base), self.ids))
+        return (_reopen, (filename, self.ids))
+
+
+class _Row:
+    def __init__(self, row, ids):
+        self.row = row
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, j):
+        return self.row[self.ids[j]].item()
+
+
+# Model indices for the first n_locs-1 stored locations plus D (the depot again)
+def model_ids(n_locs):
+    return np.append(np.arange(n_locs - 1), 0)
+
+
+# Load the store (converting first if needed). Returns the locations record
+# array, the travel times and the distances as CostMatrix objects over model
+# indices 0..N_LOCS-1, where N_LOCS = len(locations) + 1.
+def load_instance(n_stops=None, data_dir=DATA_DIR, store_dir=STORE_DIR):
+    if store_is_stale(data_dir, store_dir):
+        convert_instance(data_dir, store_dir)
+    locations = np.load(os.path.join(store_dir, LOCATIONS_FILE), mmap_mode="r")
+    if n_stops is not None:
+        locations = locations[:n_stops]
+    ids = model_ids(len(locations) + 1)
+    c = CostMatrix(np.load(os.path.join(store_dir, TRAVEL_TIMES_FILE), mmap_mode="r"), ids)
+    distances = CostMatrix(np.load(os.path.join(store_dir, DISTANCES_FILE), mmap_mode="r"), ids)
+    return locations, c, distances
+
+
+# Travel times c[rows, cols] elementwise as a float array (rows and cols
+# broadcast like NumPy index arrays). Only those entries are read, so this
+# stays cheap on a large CostMatrix.
+def entries(c, rows, cols):
+    rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp))
+    if isinstance(c, CostMatrix):
+        return np.asarray(c.base[c.ids[rows], c.ids[cols]], dtype=np.float64)
+    if isinstance(c, np.ndarray):
+        return c[rows, cols].astype(np.float64)
+    values = [c[i][j] for i, j in zip(rows.ravel().tolist(), cols.ravel().tolist())]
+    return np.array(values, dtype=np.float64).reshape(rows.shape)
+
+
+# Cost sub-matrix over the model indices in subset as an ndarray. Accepts a
+# CostMatrix or any nested list / array.
+def submatrix(c, subset):
+    if isinstance(c, CostMatrix):
+        return c.sub(subset).toarray()
+    return np.asarray(c)[np.ix_(subset, subset)]
+
+
+if __name__ == "__main__":
+    convert_instance()
+    locations, c, _ = load_instance()
+    print(f"Stored {len(locations)} locations and {len(c)}x{len(c)} model matrices in {STORE_DIR}")
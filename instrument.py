@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+"""
+Per-stage timing, memory and counters for the pipeline scripts. Wrap each
+stage in a timer and write the report at the end of the run:
+
+    with instrument.stage("load"):
+        locations, c, _ = instance_store.load_instance()
+    ...
+    instrument.write_report()
+
+Instrumentation is off unless ROUTING_PROFILE is set (or enable() is called),
+and then stage() returns a shared do-nothing context, so leaving the calls in
+costs nothing. ROUTING_PROFILE=1 records wall time and calls per stage plus
+counters; ROUTING_PROFILE=memory also runs tracemalloc and records the peak
+Python memory of every stage (this slows allocation-heavy code down a lot,
+so only use it when memory is the question). The report goes to the file in
+ROUTING_PROFILE_REPORT, profile.json by default.
+
+Subsets solved on worker processes can't time themselves into this process,
+so parallel.solve_subsets adds the build, solve and extract times and model
+sizes from every result with record_result().
+"""
+
+ENV_VAR = "ROUTING_PROFILE"
+REPORT_ENV_VAR = "ROUTING_PROFILE_REPORT"
+DEFAULT_REPORT = "profile.json"
+
+_NULL = nullcontext()
+_state = {"enabled": False, "memory": False}
+_stages = {}
+_counters = {}
+_stack = []  # highest peak seen by every open stage, innermost last
+
+
+def enable(memory=False):
+    _state["enabled"] = True
+    _state["memory"] = memory
+    _state["start"] = time.perf_counter()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state["started_tracing"] = True
+
+
+def disable():
+    if _state.pop("started_tracing", False):
+        tracemalloc.stop()
+    _state["enabled"] = False
+    _state["memory"] = False
+
+
+def enabled():
+    return _state["enabled"]
+
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+    _stack.clear()
+    _state["start"] = time.perf_counter()
+    _state["peak"] = 0
+    if _state["memory"]:
+        tracemalloc.reset_peak()
+
+
+# Time the code in the with block under name. Stages can nest and repeat;
+# every call adds to the same entry.
+def stage(name):
+    if not _state["enabled"]:
+        return _NULL
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name):
+    memory = _state["memory"]
+    if memory:
+        # save the peak so far (for the run and the enclosing stage) before
+        # restarting it
+        peak = tracemalloc.get_traced_memory()[1]
+        _state["peak"] = max(_state.get("peak", 0), peak)
+        if _stack:
+            _stack[-1] = max(_stack[-1], peak)
+        tracemalloc.reset_peak()
+        _stack.append(0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+        if memory:
+            peak = max(_stack.pop(), tracemalloc.get_traced_memory()[1])
+            _state["peak"] = max(_state.get("peak", 0), peak)
+            entry = _stages[name]
+            entry["peak_mb"] = max(entry.get("peak_mb", 0.0), peak / 2**20)
+            if _stack:
+                _stack[-1] = max(_stack[-1], peak)
+
+
+# Add seconds measured somewhere else (e.g. on a worker) to a stage
+def add(name, seconds, calls=1):
+    if not _state["enabled"]:
+        return
+    entry = _stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+    entry["seconds"] += seconds
+    entry["calls"] += calls
+
+
+def count(name, n=1):
+    if _state["enabled"]:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+# Count the variables, constraints and nonzeros of a built Gurobi model
+def count_model(m):
+    if _state["enabled"]:
+        count("models")
+        count("variables", m.NumVars)
+        count("constraints", m.NumConstrs)
+        count("nonzeros", m.NumNZs)
+
+
+# Add the build/solve/extract times and model size from a models.solve_subset
+# result. Results replayed from the cache only count as cache hits.
+def record_result(result):
+    if not _state["enabled"]:
+        return
+    if result.get("cached"):
+        count("cache_hits")
+        return
+    add("build", result["build_time"])
+    add("solve", result["runtime"])
+    add("extract", result.get("extract_time", 0.0))
+    count("models")
+    count("variables", result.get("variables", 0))
+    count("constraints", result.get("constraints", 0))
+
+
+def report():
+    result = {"argv": sys.argv, "wall_seconds": time.perf_counter() - _state.get("start", time.perf_counter()),
+              "stages": {name: dict(entry) for name, entry in _stages.items()},
+              "counters": dict(_counters)}
+    if _state["memory"]:
+        peak = max(_state.get("peak", 0), tracemalloc.get_traced_memory()[1])
+        result["peak_mb"] = peak / 2**20
+    return result
+
+
+# Write report() as JSON (to ROUTING_PROFILE_REPORT or profile.json unless
+# path is given) and print a one-line summary. Does nothing when disabled.
+def write_report(path=None):
+    if not _state["enabled"]:
+        return None
+    path = path or os.environ.get(REPORT_ENV_VAR, DEFAULT_REPORT)
+    data = report()
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    stages = " ".join(f"{name}={entry['seconds']:.2f}s" for name, entry in data["stages"].items())
+    print(f"Profile ({path}): {stages}")
+    return data
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"):
+    enable(memory=os.environ[ENV_VAR] == "memory")
@@ -1,4 +1,5 @@
-import os, json, csv
+import csv
+import instance_store
 import gurobipy as gp
 import matplotlib.pyplot as plt
 from gurobipy import GRB
@@ -18,9 +19,8 @@ from gurobipy import quicksum
 #   "lat": 42.41472
 # }
 
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"] != "Pick-up"] # 125 locations
-locations = locations[:20]
+# (drop-off locations only, read from the binary store data/store)
+locations, c, _ = instance_store.load_instance(n_stops=20)
 subsetlocations=[0,2,6,8,10,11]
 N_LOCS = len(locations) + 1 # all delivery locations + warehouse start/end
 O = 0
@@ -31,11 +31,8 @@ K = N_LOCS // 2
 # Assume that all the vehicles are the same
 # k is the number of runs, lets set k=# of locations (overshoot) so we don't have to worry about the variable
 
-# Travel Times Matrix
-# 137x137 Matrix - Time travelled stored as Seconds
-c = json.load(open(os.path.abspath("./data/travel_times_matrix.json"), "r"))
-c = c[:N_LOCS]
-# TODO: fix c[i, end-depot] costs
+# Travel Times Matrix (c from load_instance above), in seconds. D shares the
+# depot's row and column.
 
 demands = [0]
 with open("data/FBWMLocationsDemands.csv") as csv_file:
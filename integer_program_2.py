@@ -1,4 +1,5 @@
-import os, json, csv
+import csv
+import instance_store
 import gurobipy as gp
 import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
@@ -20,8 +21,7 @@ from gurobipy import quicksum
 # }
 
 # Get locations data
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"] != "Pick-up"] # 125 locations
+locations, c, _ = instance_store.load_instance() # 125 locations
 
 # Find subsets from locations using kmeans
 x = [(loc["long"], loc["lat"]) for loc in locations]
@@ -47,11 +47,8 @@ K = N_LOCS // 2
 # k is the number of runs, we need to overestimate w/ K to guarantee
 # optimal solutions.
 
-# Get travel times matrix
-c = json.load(open(os.path.abspath("./data/travel_times_matrix.json"), "r"))
-c = c[:N_LOCS]
-for i, lst in enumerate(c):
-    lst[D] = lst[0] # the depot is stored twice: once at o (0) and once at D (len(locations))
+# Travel times matrix: c from load_instance above. The depot is stored twice,
+# once at O (0) and once at D (len(locations)), sharing one row and column.
 
 # Get demands matrix
 demands = [0]
@@ -1,9 +1,9 @@
-import os, json
-import gurobipy as gp
-import matplotlib.pyplot as plt
-from gurobipy import GRB
-from gurobipy import quicksum
 import utility_final as utility
+import instance_store
+import models
+import heuristics
+import presolve
+import instrument
 
 
 """
@@ -13,9 +13,10 @@ location has an integer number of required pallets between 0 and 12. Every route
 must begin and end at the depot.
 """
 
-# Acquire locations data
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"] != "Pick-up"]
+# Acquire locations data and the cost matrix from the binary store
+# (data/store is built from the JSON files on first use)
+with instrument.stage("load"):
+    locations, c, _ = instance_store.load_instance()
 # locations[0] holds the depot's information
 
 """
@@ -32,77 +33,76 @@ O = 0 # the start (depot)
 D = N_LOCS-1 # the end (depot)
 Q = 12 # number of pallets a truck can hold
 
-# Acquire cost matrix (travel times in seconds betewen every location)
-# c[i,j] is the cost of going from location i to location j
-c = json.load(open(os.path.abspath("./data/travel_times_matrix.json"), "r"))
-c = c[:N_LOCS]
-for i, lst in enumerate(c):
-    lst[D] = lst[0]  # fix it so that i to D has same cost as i to O
+# Cost matrix (travel times in seconds betewen every location)
+# c[i,j] is the cost of going from location i to location j. D maps onto
+# the depot's row and column, so i to D has same cost as i to O
 
 # Demands matrix
 # demands[i] is the required pallets of location i (0 for the depot)
-demands = utility.get_demands(N_LOCS)
-
-
-m = gp.Model()
-
-# VARIABLES
-# x[i,j] = 1 if a truck goes from location i to location j
-x = m.addVars(N_LOCS, N_LOCS, vtype=GRB.BINARY, name="x")
-# u[i] = amount of pallets delivered to location i
-u = m.addVars(N_LOCS, vtype=GRB.INTEGER, lb=0, ub=10, name='u')
-# k = total number of routes to satisfy all locations
-k = m.addVar(vtype=GRB.INTEGER, name = 'k')
-
-# OBJECTIVE FUNCTION
-objective = quicksum(x[i, j] * c[i][j] for i in range(N_LOCS) for j in range(N_LOCS))
-m.setObjective(objective, GRB.MINIMIZE)
-
-# RUN-TIME OPTIMIZATIONS
-m.params.MIPFocus=1 # 2 and 3 seem to be marginally slower
-
-# CONSTRAINTS
-# 1.1: every location (excluding depot) left exactly once
-for i in range(1, N_LOCS-1):
-    lhs = 0
-    for j in range(1, N_LOCS):
-        lhs += x[i, j]
-    m.addConstr(lhs == 1)
-# 1.2: every location (excluding depot) entered exactly once
-for i in range(1, N_LOCS-1):
-    lhs = 0
-    for j in range(0, N_LOCS-1):
-        lhs += x[j, i]
-    m.addConstr(lhs == 1)
-# 1.3: the start depot is left exactly K times
-lhs1 = quicksum(x[O, j] for j in range(1, N_LOCS))
-m.addConstr(lhs1 == k)
-# 1.4: the end depot is entered exactly K times
-lhs2 = quicksum(x[i, D] for i in range(N_LOCS-1))
-m.addConstr(lhs2 == k)
-
-
-# 2.1: MTZ-Specific Subtour Elimination Constraints
-for i in range(1, N_LOCS-1):
-  for j in range(1, N_LOCS-1):
-    if i == j: continue
-    m.addConstr(u[i] - u[j] + Q*x[i, j] <= Q - demands[j])
-
-# 2.2: capacity constraints
-for i in range(N_LOCS):
-    m.addConstr(demands[i] <= u[i])
-    m.addConstr(u[i] <= Q)
-
-# 2.1: no self-loops
-for i in range(N_LOCS):
-    m.addConstr(x[i, i] == 0)
+with instrument.stage("load"):
+    demands = utility.get_demands(N_LOCS)
+
+
+# Subtour elimination: "mtz" adds the MTZ constraints up front, "lazy" leaves
+# them out and cuts off subtours/overloaded routes in a callback instead (see
+# models.build_two_index_model). USER_CUTS also separates the cuts at
+# fractional nodes in "lazy" mode.
+SUBTOUR = "lazy"
+USER_CUTS = True
+# Start from the Clarke-Wright savings routes instead of an empty incumbent
+WARM_START = True
+# Build the "mtz" model with the matrix API (one sparse call per constraint
+# family) instead of constraint-by-constraint
+VECTORIZED = True
+# Only create x[i,j] for the arcs to each stop's KNN nearest neighbors (and
+# the depot arcs) instead of for every pair (None: every pair). VERIFY_ARCS
+# adds back pruned arcs whose LP reduced cost is negative.
+KNN = None
+VERIFY_ARCS = False
+# Drop arcs no optimal solution needs, bound u per stop and k from below
+# (see presolve.py). It speeds up "mtz" but not "lazy" solves.
+PRESOLVE = SUBTOUR == "mtz"
+# Put each route's stops in their cheapest order (exact, heuristics.held_karp)
+RESEQUENCE = True
+# e.g. "routes.png" to write the plots (the 4 groups to groups_routes.png)
+# instead of showing them
+PLOT_FILE = None
+
+# Build the model over every location (see models.py for the formulation)
+with instrument.stage("build"):
+    subset = list(range(N_LOCS))
+    start = heuristics.savings_routes(c, demands, Q)
+    if PRESOLVE:
+        # keep the start feasible without the arcs presolve drops
+        start = presolve.split_routes(start, presolve.usable_arcs(c, demands, Q))
+    if KNN:
+        arcs = models.candidate_arcs(c, demands, Q, KNN, start)
+        if VERIFY_ARCS:
+            arcs = models.verify_arcs(c, demands, subset, Q, arcs, SUBTOUR)
+        m, x, u, k = models.build_two_index_model(c, demands, subset, Q, subtour=SUBTOUR,
+                                                  user_cuts=USER_CUTS, arcs=arcs, presolve=PRESOLVE)
+    elif SUBTOUR == "mtz" and VECTORIZED:
+        m, x, u, k = models.build_two_index_mvar(c, demands, subset, Q, PRESOLVE)
+    else:
+        m, x, u, k = models.build_two_index_model(c, demands, subset, Q, subtour=SUBTOUR,
+                                                  user_cuts=USER_CUTS, presolve=PRESOLVE)
+    print(f"Built the model in {m._build_time:.2f}s")
+    if WARM_START:
+        models.set_two_index_start(m, x, u, k, start, demands)
+instrument.count_model(m)
 
 # Solve the LP
-m.optimize()
+with instrument.stage("solve"):
+    models.optimize(m)
 
 # RESULTS
-routes = utility.build_routes(x, N_LOCS, O, D)
+with instrument.stage("extract"):
+    routes = utility.build_routes(x, N_LOCS, O, D, m)
+    if RESEQUENCE:
+        routes = heuristics.resequence(routes, c)
 print(",\n".join(str(route) for route in routes))
-utility.plot_all_routes(routes, locations)
-utility.plot_4_groups_of_routes(routes, locations)
-utility.print_routes(routes, demands)
\ No newline at end of file
+with instrument.stage("plot"):
+    utility.plot_all_routes(routes, locations, PLOT_FILE)
+    utility.plot_4_groups_of_routes(routes, locations, PLOT_FILE and "groups_" + PLOT_FILE)
+utility.print_routes(routes, demands)
+instrument.write_report()
\ No newline at end of file
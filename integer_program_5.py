@@ -1,114 +1,80 @@
-import os, json
-import gurobipy as gp
-import matplotlib.pyplot as plt
-from gurobipy import GRB
-from gurobipy import quicksum
 import utility_final as utility
+import instance_store
+import parallel
+import scheduler
+import cache
+import heuristics
+import lns
+import instrument
 
-# STEP 1: PROCESS THE DATA
-# Locations data and constants
-locations = json.load(open(os.path.abspath("./data/locations.json"), "r"))
-locations = [loc for loc in locations if loc["type"]
-             != "Pick-up"]  # 125 locations
-#locations = locations[:15]
-subsets = utility.get_subsets2(locations, 4)
-N_LOCS = len(locations) + 1  # all delivery locations + warehouse start/end
-O = 0
-D = N_LOCS-1
-Q = 12
+USE_CACHE = True  # replay clusters whose inputs haven't changed from data/cache
+PLOT_FILE = None  # e.g. "routes.png" to write the plot instead of showing it
+PARALLEL = True # solve the subsets on a pool of worker processes
+# Seconds for the whole solve (None: every cluster is solved to optimality).
+# The clusters then share the budget and the time left over goes to the
+# ones with the worst gap, see scheduler.py.
+TIME_BUDGET = None
+TARGET_GAP = 0.01
+# "two_index" (arc model with MTZ) or "set_partitioning" (column generation
+# over whole routes, colgen.py)
+FORMULATION = "two_index"
+# Build the two-index models over each stop's KNN nearest neighbors only
+# (None: every pair of stops), see models.candidate_arcs
+KNN = None
+# Merge and rebalance routes across cluster boundaries after solving
+CONSOLIDATE = True
+# Seconds of large neighborhood search on the final routes (None: skip it).
+# It re-solves a few neighboring routes at a time, across the clusters.
+LNS_BUDGET = None
 
-# The cost matrix (travel times)
-c = json.load(open(os.path.abspath("./data/travel_times_matrix.json"), "r"))
-c = c[:N_LOCS]
-for i, lst in enumerate(c):
-    lst[D] = lst[0]  # fix it so that D has same cost as O
-# Demands matrix
-demands = utility.get_demands(N_LOCS)
-routes = []
+# Worker processes import this file, so only run the pipeline from the main one
+if __name__ == "__main__":
+    # STEP 1: PROCESS THE DATA
+    # Locations data and constants
+    with instrument.stage("load"):
+        locations, c, _ = instance_store.load_instance()  # 125 locations
+    #locations = locations[:15]
+    N_LOCS = len(locations) + 1  # all delivery locations + warehouse start/end
+    O = 0
+    D = N_LOCS-1
+    Q = 12
+    # c is the cost matrix (travel times), D shares the depot's row and column
+    # Demands matrix
+    with instrument.stage("load"):
+        demands = utility.get_demands(N_LOCS)
+    # Clusters with at most 60 pallets / 25 stops each, grouped by travel time
+    # (K-Means on lat/long, get_subsets2, gave one 77 stop cluster)
+    with instrument.stage("cluster"):
+        subsets = utility.get_subsets3(locations, c, demands, max_demand=60, max_stops=25)
+    routes = []
 
-for subset in subsets:
-    # MODEL
-    m = gp.Model()
+    # STEP 2: RUN INTEGER PROGRAM ON EACH SUBSET
+    # Each model only has variables for the locations in its subset (local
+    # indices), see models.py. The subsets are independent, so they are solved
+    # side by side on a process pool unless PARALLEL is off.
+    if TIME_BUDGET is None:
+        results = parallel.solve_subsets(c, demands, subsets, Q, FORMULATION,
+                                         processes=None if PARALLEL else 1,
+                                         cache=cache.SubsetCache() if USE_CACHE else None,
+                                         options={"knn": KNN} if KNN else None)
+    else:
+        results = scheduler.solve_on_budget(c, demands, subsets, Q, TIME_BUDGET, TARGET_GAP,
+                                            FORMULATION, {"OutputFlag": 0})
+        scheduler.print_report(results)
+    for set_num, result in enumerate(results):
+        if result["routes"] is None:
+            # stopped on a time limit before finding any routes
+            print(f"No solution for subset {set_num}, using the heuristic routes.")
+            result["routes"] = heuristics.solve(c, demands, Q, result["subset"])
+        routes += result["routes"]
+    if CONSOLIDATE:
+        routes, before, after = heuristics.consolidate(routes, c, demands, Q)
+        print(f"Consolidated {before[0]} routes ({before[1]:.0f}s) into {after[0]} ({after[1]:.0f}s)")
+    if LNS_BUDGET:
+        routes, trajectory = lns.improve(routes, c, demands, Q, LNS_BUDGET, params={"OutputFlag": 0})
+        print(f"LNS: {trajectory[0][1]:.0f}s -> {trajectory[-1][1]:.0f}s in {len(trajectory) - 1} iterations")
 
-    # VARIABLES
-    # x_ijk = 1 if run #k goes from i to k
-    x = m.addVars(N_LOCS, N_LOCS, vtype=GRB.BINARY, name="x")
-    # u_ik = amt delivered by route k to location i
-    u = m.addVars(N_LOCS, vtype=GRB.INTEGER, lb=0, ub=10, name='u')
-    # k = number of routes
-    k = m.addVar(vtype=GRB.INTEGER, name = 'k')
-
-    # OBJECTIVE FUNCTION
-    objective = quicksum(x[i, j] * c[i][j] for i in subset for j in subset)
-    m.setObjective(objective, GRB.MINIMIZE)
-
-    # RUN-TIME OPTIMIZATIONS
-    m.params.MIPFocus=1 # 2 or 3 don't seem to get faster
-
-    # CONSTRAINTS
-    # 1.1 every location (excluding depot) left exactly once
-    for i in subset[1:-1]:
-        lhs = 0
-        for j in subset[1:]:
-            lhs += x[i, j]
-        m.addConstr(lhs == 1)
-    # 1.2: every location (excluding depot) entered exactly once
-    for i in subset[1:-1]:
-        lhs = 0
-        for j in subset[:-1]:
-            lhs += x[j, i]
-        m.addConstr(lhs == 1)
-    # 1.3: the start depot is left exactly K times
-    lhs1 = quicksum(x[O, j] for j in subset[1:])
-    m.addConstr(lhs1 == k)
-    # 1.4: the end depot is entered exactly K times
-    lhs2 = quicksum(x[i, D] for i in subset[:-1])
-    m.addConstr(lhs2 == k)
-
-    # 2.1: MTZ-Specific SEC
-    for i in subset[1:-1]:
-        for j in subset[1:-1]:
-            if i == j: continue
-            m.addConstr(u[i] - u[j] + Q*x[i, j] <= Q - demands[j])
-
-    # 2.2: capacity constraints
-    for i in subset:
-        m.addConstr(demands[i] <= u[i])
-        m.addConstr(u[i] <= Q)
-
-    # 2.1: no self-loops
-    for i in subset[1:-1]:
-        m.addConstr(x[i, i] == 0)
-
-    # Solve the LP
-    m.optimize()
-
-    for i in range(1, N_LOCS):
-        if x[O, i].x == 1:
-            left = i
-            route = [O, i]
-            while left != D:
-                for right in range(1, N_LOCS):
-                    if x[left, right].x == 1:
-                        route.append(right)
-                        left = right
-                        break
-            routes.append(route)
-
-# STEP 3.2: VISUALIZE THE ROUTES
-color_cycle = ['b', 'g', 'r', 'c', 'm', 'y', 'k']
-color_i = 0
-for route in routes:
-    for i, j in zip(route[:-1], route[1:]):
-        i = i if i != D else 0
-        j = j if j != D else 0
-        xs = (locations[i]["long"], locations[j]["long"])
-        ys = (locations[i]["lat"], locations[j]["lat"])
-        plt.plot(xs, ys, color=color_cycle[color_i])
-    color_i = (color_i + 1) % len(color_cycle)
-
-plt.axis('equal')
-plt.legend()
-plt.show()
-
-pass
\ No newline at end of file
+    # STEP 3.2: VISUALIZE THE ROUTES
+    with instrument.stage("plot"):
+        utility.plot_all_routes(routes, locations, PLOT_FILE)
+    instrument.write_report()
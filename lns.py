@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import instance_store
+import heuristics
+import models
+
+"""
+Large neighborhood search with Gurobi as the repair step. The full 124-stop
+model stalls and a decomposition fixes the cluster boundaries for good; LNS
+instead starts from any complete plan and keeps re-solving small pieces of
+it. Each iteration picks a few routes, takes their stops out and solves them
+again as one subset with the two-index model (lazy subtour cuts, warm
+started from the routes taken out). The other routes don't change, so the
+subset is a small MIP. A better piece replaces the old one.
+
+The routes to destroy are picked in one of three ways, in turn:
+
+  related - the routes of the stops closest (in travel time) to a random stop
+  route   - a random route and the routes closest to it
+  random  - random routes
+
+Each time routes are added until the piece has at least size stops.
+"""
+
+DESTROY = ("related", "route", "random")
+
+
+# Indices of the routes to re-solve. t is the symmetric travel time matrix
+# and route_of[i] the route serving stop i.
+def pick_routes(operator, routes, route_of, t, size, rng):
+    stops = np.flatnonzero(route_of >= 0)
+    if operator == "related":
+        seed = rng.choice(stops)
+        order = route_of[stops[np.argsort(t[seed, stops], kind="stable")]]
+    elif operator == "route":
+        r = rng.integers(len(routes))
+        members = routes[r][1:-1]
+        order = route_of[stops[np.argsort(t[np.ix_(members, stops)].min(axis=0), kind="stable")]]
+    else:
+        order = rng.permutation(len(routes))
+    picked = []
+    count = 0
+    for r in order:
+        if r not in picked:
+            picked.append(int(r))
+            count += len(routes[r]) - 2
+            if count >= size:
+                break
+    return picked
+
+
+# Improve routes (global ids, [O, ..., D]) for budget seconds. size is the
+# number of stops re-solved per iteration and iter_limit the longest single
+# MIP solve. params are Gurobi parameters for the repair MIPs (their log is
+# off unless OutputFlag is set). Returns the best routes and the trajectory, one entry per
+# iteration: (seconds since start, cost after the iteration, operator,
+# stops re-solved, accepted).
+def improve(routes, c, demands, Q, budget, size=20, iter_limit=10.0, destroy=DESTROY,
+            params=None, seed=0, verbose=True):
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    cs = instance_store.submatrix(c, list(range(len(demands)))).astype(np.float64)
+    t = (cs + cs.T) / 2
+    routes = [list(route) for route in routes]
+    O, D = routes[0][0], routes[0][-1]
+    cost = heuristics.routes_cost(routes, cs)
+    trajectory = [(0.0, cost, "start", 0, True)]
+
+    iteration = 0
+    while True:
+        remaining = budget - (time.perf_counter() - start_time)
+        if remaining < 1.0:
+            break
+        operator = destroy[iteration % len(destroy)]
+        iteration += 1
+        route_of = np.full(len(demands), -1)
+        for r, route in enumerate(routes):
+            route_of[route[1:-1]] = r
+        picked = pick_routes(operator, routes, route_of, t, size, rng)
+        old = [routes[r] for r in picked]
+        subset = [O] + sorted(i for route in old for i in route[1:-1]) + [D]
+
+        # no solver log unless params turn it on
+        subset_params = {"OutputFlag": 0, **(params or {})}
+        subset_params["TimeLimit"] = min(iter_limit, remaining)
+        result = models.solve_subset(c, demands, subset, Q, "two_index", subset_params,
+                                     subtour="lazy", start=old)
+        old_cost = heuristics.routes_cost(old, cs)
+        accepted = result["routes"] is not None and result["objective"] < old_cost - 1e-6
+        if accepted:
+            routes = [route for r, route in enumerate(routes) if r not in picked] + result["routes"]
+            cost += result["objective"] - old_cost
+        trajectory.append((time.perf_counter() - start_time, cost, operator, len(subset) - 2, accepted))
+        if verbose and accepted:
+            print(f"LNS {iteration} ({operator}, {len(subset) - 2} stops): {cost:.0f}")
+    return routes, trajectory
@@ -0,0 +1,809 @@
+import io
+import math
+import time
+import contextlib
+import numpy as np
+import scipy.sparse as sp
+import gurobipy as gp
+from gurobipy import GRB
+from gurobipy import quicksum
+import instance_store
+import utility_final
+import heuristics
+import colgen
+import presolve as vrp_presolve
+
+"""
+Integer programs over a subset of the locations. A subset is a list of global
+location ids [O, stop, stop, ..., D] (the format get_subsets/get_subsets2
+return). The models only create variables for the subset: local index i
+stands for location subset[i], so local 0 is the start depot and local
+len(subset)-1 is the end depot. Build time and memory scale with the size of
+the subset instead of with N_LOCS.
+
+Routes come back in local indices; to_global() maps them to location ids.
+"""
+
+
+# Local cost matrix (nested lists) and demands for a subset
+def local_data(c, demands, subset):
+    cs = instance_store.submatrix(c, subset).tolist()
+    ds = [demands[i] for i in subset]
+    return cs, ds
+
+
+# Type of the load variables u: whole pallets, or continuous when some demand
+# is fractional (integer loads could not add up to it)
+def load_vtype(ds):
+    return GRB.INTEGER if all(float(d).is_integer() for d in ds) else GRB.CONTINUOUS
+
+
+# Map routes in local indices back to global location ids
+def to_global(routes, subset):
+    return [[subset[i] for i in route] for route in routes]
+
+
+# Map routes in global location ids to the local indices of subset
+def to_local(routes, subset):
+    local = {loc: i for i, loc in enumerate(subset)}
+    return [[local[i] for i in route] for route in routes]
+
+
+# Pallets on the truck after each stop of a route (local indices)
+def route_loads(route, ds):
+    loads = []
+    load = 0
+    for i in route:
+        load += ds[i]
+        loads.append(load)
+    return loads
+
+
+# Set the Start attribute of a tupledict or MVar from an array indexed the
+# same way (values[i, j] for x[i, j])
+def set_start(m, var, values):
+    if isinstance(var, gp.MVar):
+        var.Start = values
+    else:
+        m.setAttr("Start", list(var.values()), [values[key] for key in var.keys()])
+
+
+# Load routes (local indices) as the MIP start of a two-index model
+def set_two_index_start(m, x, u, k, routes, ds):
+    n = len(ds)
+    start_x = np.zeros((n, n))
+    start_u = np.array(ds, dtype=np.float64)
+    for route in routes:
+        start_x[route[:-1], route[1:]] = 1
+        start_u[route[1:-1]] = route_loads(route, ds)[1:-1]
+    start_u[0] = start_u[-1] = 0
+    set_start(m, x, start_x)
+    if u is not None:
+        set_start(m, u, start_u)
+    k.Start = len(routes)
+
+
+# Load routes (local indices) as the MIP start of a three-index model with K
+# vehicles. Route r goes to vehicle r and vehicles left over drive O -> D;
+# the routes are first put in the order the model's symmetry breaking wants.
+def set_three_index_start(m, x, y, u, routes, ds, K):
+    if len(routes) > K:
+        return
+    routes = symmetry_order(routes, ds, getattr(m, "_symmetry", ()))
+    n = len(ds)
+    start_x = np.zeros((n, n, K))
+    start_y = np.zeros((n, K))
+    start_u = np.repeat(np.array(ds, dtype=np.float64)[:, None], K, axis=1)
+    for k in range(K):
+        route = routes[k] if k < len(routes) else [0, n-1]
+        start_x[route[:-1], route[1:], k] = 1
+        start_y[route, k] = 1
+        start_u[route[1:-1], k] = route_loads(route, ds)[1:-1]
+        start_y[0, k] = start_y[n-1, k] = 1
+    set_start(m, x, start_x)
+    set_start(m, y, start_y)
+    set_start(m, u, start_u)
+
+
+# The K trucks of the three-index model are identical, so every solution
+# shows up once per ordering of its routes over the vehicles (K! times) and
+# branch and bound keeps exploring copies of the same nodes. Symmetry
+# breaking keeps one ordering:
+#   "load"         - route loads don't increase with k
+#   "lowest_index" - stop i only rides vehicles k <= i-1, i.e. routes are
+#                    ordered by their lowest stop
+#   "unused_last"  - vehicles that drive straight from O to D come last
+# "load" and "lowest_index" pick different orderings, so only one of them
+# can be used; "unused_last" combines with either.
+SYMMETRY_OPTIONS = ("load", "lowest_index", "unused_last")
+
+
+def check_symmetry(symmetry):
+    symmetry = tuple(symmetry or ())
+    unknown = set(symmetry) - set(SYMMETRY_OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown symmetry breaking {sorted(unknown)}")
+    if "load" in symmetry and "lowest_index" in symmetry:
+        raise ValueError("\"load\" and \"lowest_index\" symmetry breaking exclude each other")
+    return symmetry
+
+
+# Routes (local indices) in the vehicle order symmetry breaking allows
+def symmetry_order(routes, ds, symmetry):
+    if "load" in symmetry:
+        return sorted(routes, key=lambda route: -sum(ds[i] for i in route))
+    if "lowest_index" in symmetry:
+        return sorted(routes, key=lambda route: min(route[1:-1], default=len(ds)))
+    return routes
+
+
+# Variables of a tupledict or MVar as a dict keyed by index tuples
+def var_dict(var):
+    if not isinstance(var, gp.MVar):
+        return var
+    values = np.array(var.tolist(), dtype=object)
+    return {index: values[index] for index in np.ndindex(values.shape)}
+
+
+# Add the symmetry breaking constraints (see SYMMETRY_OPTIONS) to a
+# three-index model with n locations and K vehicles
+def add_symmetry_breaking(m, x, y, ds, K, symmetry):
+    symmetry = check_symmetry(symmetry)
+    m._symmetry = symmetry
+    if not symmetry:
+        return
+    x, y = var_dict(x), var_dict(y)
+    n = len(ds)
+    D = n-1
+    if "load" in symmetry:
+        for k in range(K - 1):
+            m.addConstr(quicksum(ds[i] * y[i, k] for i in range(1, D))
+                        >= quicksum(ds[i] * y[i, k + 1] for i in range(1, D)))
+    if "lowest_index" in symmetry:
+        for i in range(1, D):
+            for k in range(i, K):
+                y[i, k].UB = 0
+    if "unused_last" in symmetry:
+        for k in range(K - 1):
+            m.addConstr(x[0, D, k] <= x[0, D, k + 1])
+    m.update()
+
+
+# Sparse arc set for the two-index model over local indices: every arc out
+# of O and into D, plus the arcs between two stops where one is among the
+# other's k nearest stops (by travel time, either direction). Arcs between
+# stops whose demands add up to more than Q can never be used and are left
+# out. The arcs of routes (local indices, e.g. a warm start) are always kept.
+def candidate_arcs(cs, ds, Q, k, routes=None):
+    cs = np.asarray(cs, dtype=np.float64)
+    ds = np.asarray(ds, dtype=np.float64)
+    n = len(ds)
+    D = n-1
+    stops = np.arange(1, D)
+    feasible = ds[stops, None] + ds[None, stops] <= Q
+    np.fill_diagonal(feasible, False)
+    t = np.where(feasible, cs[np.ix_(stops, stops)], np.inf)
+    near = np.zeros_like(feasible)
+    if len(stops) > 1:
+        k = min(k, len(stops) - 1)
+        nearest = np.argpartition(t, k - 1, axis=1)[:, :k]
+        near[np.repeat(np.arange(len(stops)), k), nearest.ravel()] = True
+    keep = (near | near.T) & feasible
+
+    arcs = {(0, D)}
+    arcs.update((0, int(j)) for j in stops)
+    arcs.update((int(i), D) for i in stops)
+    arcs.update((int(stops[a]), int(stops[b])) for a, b in zip(*np.nonzero(keep)))
+    for route in routes or []:
+        arcs.update(zip(route[:-1], route[1:]))
+    return sorted(arcs)
+
+
+# Check a sparse arc set against the LP relaxation: with the duals of the
+# out/in rows (1.1 - 1.4) of the model over arcs, a left out arc (i, j) has
+# reduced cost c[i,j] - out_i - in_j. Arcs with negative reduced cost could
+# improve the LP, so they are added and the check is repeated, up to
+# max_rounds times. The MTZ rows of the left out arcs are not part of the
+# estimate. Returns the (possibly larger) arc list.
+def verify_arcs(c, demands, subset, Q, arcs, subtour="mtz", max_rounds=5, eps=1e-6):
+    cs = instance_store.submatrix(c, subset).astype(np.float64)
+    ds = np.array([demands[i] for i in subset], dtype=np.float64)
+    n = len(subset)
+    D = n-1
+    allowed = ds[:, None] + ds[None, :] <= Q
+    allowed[0, :] = allowed[:, D] = True
+    allowed[:, 0] = allowed[D, :] = False
+    np.fill_diagonal(allowed, False)
+    arcs = set(arcs)
+    for _ in range(max_rounds):
+        m, x, u, k = build_two_index_model(c, demands, subset, Q, subtour, arcs=sorted(arcs))
+        r = m.relax()
+        r.Params.OutputFlag = 0
+        r.optimize()
+        if r.Status != GRB.OPTIMAL:
+            break
+        duals = dict(zip(r.getAttr("ConstrName"), r.getAttr("Pi")))
+        out = np.array([duals.get(f"out[{i}]", 0.0) for i in range(n)])
+        into = np.array([duals.get(f"in[{j}]", 0.0) for j in range(n)])
+        reduced = cs - out[:, None] - into[None, :]
+        present = np.zeros((n, n), dtype=bool)
+        present[tuple(np.array(sorted(arcs)).T)] = True
+        new = np.argwhere(allowed & ~present & (reduced < -eps))
+        if len(new) == 0:
+            break
+        arcs.update((int(i), int(j)) for i, j in new)
+    return sorted(arcs)
+
+
+# Two-index model (integer_program_4.py) restricted to subset.
+# Returns the model, x[i,j], u[i] and the route count k.
+#
+# subtour picks how subtours are eliminated:
+#   "mtz"  - the MTZ constraints (2.1) with load variables u
+#   "lazy" - no u and no MTZ rows; subtour and capacity cuts are separated in
+#            a callback when Gurobi finds an integer solution (u is None).
+#            user_cuts also separates them at fractional nodes.
+# Solve with optimize(m) so that the callback is used.
+#
+# arcs limits x to a list of (i, j) pairs (see candidate_arcs); by default
+# there is an x[i,j] for every pair. With presolve x only has the arcs
+# presolve.usable_arcs keeps, u gets per-stop bounds instead of the 2.2 rows
+# and (with "mtz") k starts at presolve.fleet_bound.
+def build_two_index_model(c, demands, subset, Q, subtour="mtz", user_cuts=False, arcs=None,
+                          presolve=False):
+    build_start = time.perf_counter()
+    cs, ds = local_data(c, demands, subset)
+    n = len(subset)
+    O = 0
+    D = n-1
+    lb, ub = np.zeros(n), np.full(n, Q)
+    if presolve:
+        usable = vrp_presolve.usable_arcs(cs, ds, Q)
+        if arcs is None:
+            arcs = [(int(i), int(j)) for i, j in zip(*np.nonzero(usable))]
+        else:
+            arcs = [(i, j) for i, j in arcs if usable[i, j]]
+        lb, ub = vrp_presolve.load_bounds(ds, Q, usable)
+
+    m = gp.Model()
+
+    # VARIABLES
+    # x[i,j] = 1 if a truck goes from location i to location j
+    if arcs is None:
+        x = m.addVars(n, n, vtype=GRB.BINARY, name="x")
+    else:
+        x = m.addVars(arcs, vtype=GRB.BINARY, name="x")
+    # u[i] = pallets on the truck once it has delivered to location i
+    u = None
+    if subtour == "mtz":
+        u = m.addVars(n, vtype=load_vtype(ds), lb=lb.tolist(), ub=ub.tolist(), name='u')
+    # k = total number of routes to satisfy all locations
+    # (the lazy capacity cuts already imply presolve's bound on it, and
+    # adding it as well slows those solves down)
+    k = m.addVar(vtype=GRB.INTEGER, lb=vrp_presolve.fleet_bound(ds, Q) if presolve and subtour == "mtz" else 0,
+                 name='k')
+
+    # OBJECTIVE FUNCTION
+    objective = quicksum(x[i, j] * cs[i][j] for i, j in x.keys())
+    m.setObjective(objective, GRB.MINIMIZE)
+
+    # RUN-TIME OPTIMIZATIONS
+    m.params.MIPFocus = 1  # 2 and 3 seem to be marginally slower
+
+    # CONSTRAINTS
+    # 1.1: every location (excluding depot) left exactly once
+    for i in range(1, D):
+        m.addConstr(quicksum(x[i, j] for j in range(1, n) if (i, j) in x) == 1, name=f"out[{i}]")
+    # 1.2: every location (excluding depot) entered exactly once
+    for i in range(1, D):
+        m.addConstr(quicksum(x[j, i] for j in range(D) if (j, i) in x) == 1, name=f"in[{i}]")
+    # 1.3: the start depot is left exactly k times
+    m.addConstr(quicksum(x[O, j] for j in range(1, n) if (O, j) in x) == k, name="out[0]")
+    # 1.4: the end depot is entered exactly k times
+    m.addConstr(quicksum(x[i, D] for i in range(D) if (i, D) in x) == k, name=f"in[{D}]")
+
+    if subtour == "mtz":
+        # 2.1: MTZ-Specific Subtour Elimination Constraints
+        for i in range(1, D):
+            for j in range(1, D):
+                if i == j or (i, j) not in x:
+                    continue
+                m.addConstr(u[i] - u[j] + Q*x[i, j] <= Q - ds[j], name=f"mtz[{i},{j}]")
+
+        # 2.2: capacity constraints (the bounds of u with presolve)
+        if not presolve:
+            for i in range(n):
+                m.addConstr(ds[i] <= u[i], name=f"load[{i}]")
+                m.addConstr(u[i] <= Q)
+    else:
+        # 2.1: subtour and capacity cuts are added by subtour_callback
+        m._x = x
+        m._ds = ds
+        m._Q = Q
+        m._solve_callback = subtour_callback
+        m.Params.LazyConstraints = 1
+        if user_cuts:
+            m.Params.PreCrush = 1
+        m._user_cuts = user_cuts
+
+    # 2.3: no self-loops
+    for i in range(n):
+        if (i, i) in x:
+            m.addConstr(x[i, i] == 0)
+
+    m.update()
+    m._build_time = time.perf_counter() - build_start
+    return m, x, u, k
+
+
+# Context for building a model: gurobipy prints the builders' own settings
+# ("Set parameter MIPFocus ...") before params can turn the log off, so those
+# lines are dropped when params has OutputFlag 0
+def quiet(params):
+    if (params or {}).get("OutputFlag", 1) == 0:
+        return contextlib.redirect_stdout(io.StringIO())
+    return contextlib.nullcontext()
+
+
+# Optimize m, with the callback the builder attached (if any)
+def optimize(m):
+    m.optimize(getattr(m, "_solve_callback", None))
+
+
+# Groups of stops (local indices) joined by arcs with x[i,j] + x[j,i] above
+# threshold. The depots are left out, so a route from O to D shows up as the
+# group of stops it visits and a subtour as a group with no depot arcs.
+def connected_stops(vals, n, threshold):
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (i, j), val in vals.items():
+        if 0 < i < n-1 and 0 < j < n-1 and i != j and val > threshold:
+            parent[find(i)] = find(j)
+    groups = {}
+    for i in range(1, n-1):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+# Rounded capacity inequality for the stops S: the arcs inside S can be used
+# at most |S| - ceil(d(S)/Q) times. This cuts off subtours (which use |S| arcs)
+# and routes that carry more than Q pallets.
+def capacity_cut(x, ds, Q, S):
+    lhs = quicksum(x[i, j] for i in S for j in S if i != j and (i, j) in x)
+    rhs = len(S) - math.ceil(sum(ds[i] for i in S) / Q)
+    return lhs, rhs
+
+
+# Gurobi callback for the "lazy" two-index model. On integer solutions every
+# subtour and overloaded route is cut off with a lazy constraint; with
+# user_cuts the same inequalities are separated on fractional node solutions.
+def subtour_callback(model, where):
+    x, ds, Q = model._x, model._ds, model._Q
+    n = len(ds)
+    if where == GRB.Callback.MIPSOL:
+        vals = model.cbGetSolution(x)
+        for S in connected_stops(vals, n, 0.5):
+            entered = sum(vals[0, i] for i in S) > 0.5
+            if entered and sum(ds[i] for i in S) <= Q:
+                continue
+            lhs, rhs = capacity_cut(x, ds, Q, S)
+            model.cbLazy(lhs <= rhs)
+    elif where == GRB.Callback.MIPNODE and model._user_cuts:
+        if model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+            return
+        vals = model.cbGetNodeRel(x)
+        for S in connected_stops(vals, n, 1e-3):
+            if len(S) < 2:
+                continue
+            inside = sum(vals[i, j] for i in S for j in S if i != j and (i, j) in vals)
+            lhs, rhs = capacity_cut(x, ds, Q, S)
+            if inside > rhs + 1e-6:
+                model.cbCut(lhs <= rhs)
+
+
+# Three-index model (integer_program_3.py) with K vehicles restricted to
+# subset. Returns the model, x[i,j,k], y[i,k] and u[i,k]. symmetry is a list
+# of SYMMETRY_OPTIONS to break the symmetry between the vehicles. With
+# presolve the arcs presolve.usable_arcs drops are fixed to 0 (and get no MTZ
+# rows), u gets per-stop bounds instead of the 1.14 rows and at most
+# K - presolve.fleet_bound vehicles stay unused.
+def build_three_index_model(c, demands, subset, Q, K, symmetry=None, presolve=False):
+    build_start = time.perf_counter()
+    cs, ds = local_data(c, demands, subset)
+    n = len(subset)
+    O = 0
+    D = n-1
+    usable = np.ones((n, n), dtype=bool)
+    if presolve:
+        usable = vrp_presolve.usable_arcs(cs, ds, Q)
+        lb, ub = vrp_presolve.load_bounds(ds, Q, usable)
+
+    m = gp.Model()
+
+    # VARIABLES
+    # x_ijk = 1 if route #k goes from i to j
+    x = m.addVars(n, n, K, vtype=GRB.BINARY, name="x")
+    # y_ik = 1 if location i is on route k
+    y = m.addVars(n, K, vtype=GRB.BINARY, name="y")
+    # u_ik = amt delivered by route k to location i
+    u = m.addVars(n, K, vtype=load_vtype(ds), lb=0, ub=Q, name='u')
+    if presolve:
+        for i, j in zip(*np.nonzero(~usable)):
+            for k in range(K):
+                x[i, j, k].UB = 0
+        for i in range(n):
+            for k in range(K):
+                u[i, k].LB = lb[i]
+                u[i, k].UB = ub[i]
+
+    # OBJECTIVE FUNCTION
+    objective = quicksum(x[i, j, k] * cs[i][j]
+                         for i in range(n) for j in range(n) for k in range(K))
+    m.setObjective(objective, GRB.MINIMIZE)
+
+    # RUN-TIME OPTIMIZATIONS
+    m.params.MIPFocus = 1  # 2 or 3 don't seem to get faster
+
+    # CONSTRAINTS
+    # 1.9: every location (not depot) visited exactly once
+    for i in range(1, D):
+        m.addConstr(quicksum(y[i, k] for k in range(K)) == 1)
+    # 1.10.1: every location (not depot) left exactly once
+    for i in range(1, D):
+        m.addConstr(quicksum(x[i, j, k] for j in range(1, n) for k in range(K)) == 1)
+    # 1.10.2: every location (not depot) entered exactly once
+    for i in range(1, D):
+        m.addConstr(quicksum(x[j, i, k] for j in range(D) for k in range(K)) == 1)
+    # 1.10.3: the start depot is left once in each run
+    for k in range(K):
+        m.addConstr(quicksum(x[O, j, k] for j in range(1, n)) == 1)
+    # 1.10.4: the end depot is entered once in each run
+    for k in range(K):
+        m.addConstr(quicksum(x[i, D, k] for i in range(D)) == 1)
+    # sum of the ways into it minus the ways out is 0
+    for k in range(K):
+        for i in range(1, D):
+            ways_in = quicksum(x[j, i, k] for j in range(D))
+            ways_out = quicksum(x[i, j, k] for j in range(1, n))
+            m.addConstr(ways_in - ways_out == 0)
+
+    # 1.11: for all the locations, y_ik = 1 if we leave the location (x[i, j, k] = 1)
+    for i in range(1, D):
+        for k in range(K):
+            m.addConstr(y[i, k] == quicksum(x[i, j, k] for j in range(1, n)))
+
+    # 1.12: y_ok and y_dk = 1 always
+    for k in range(K):
+        m.addConstr(y[O, k] == 1)
+        m.addConstr(y[D, k] == 1)
+
+    # 1.13: MTZ-Specific SEC
+    for i in range(1, D):
+        for j in range(1, D):
+            if i == j or not usable[i, j]:
+                continue
+            for k in range(K):
+                m.addConstr(u[i, k] - u[j, k] + Q*x[i, j, k] <= Q - ds[j])
+
+    # 1.14: capacity constraints (the bounds of u with presolve)
+    if not presolve:
+        for i in range(n):
+            for k in range(K):
+                m.addConstr(ds[i] <= u[i, k])
+                m.addConstr(u[i, k] <= Q)
+    else:
+        # the stops need at least fleet_bound vehicles
+        m.addConstr(quicksum(x[O, D, k] for k in range(K)) <= K - vrp_presolve.fleet_bound(ds, Q),
+                    name="fleet")
+
+    # 2.1: no self-loops
+    for k in range(K):
+        for i in range(n):
+            m.addConstr(x[i, i, k] == 0)
+
+    add_symmetry_breaking(m, x, y, ds, K, symmetry)
+    m.update()
+    m._build_time = time.perf_counter() - build_start
+    return m, x, y, u
+
+
+# Sparse constraint matrix with a row for every entry of rows; the entry's
+# coefficient vals goes in column cols. rows, cols and vals are arrays of the
+# same length.
+def sparse_rows(rows, cols, vals, n_rows, n_cols):
+    rows = np.concatenate(rows) if isinstance(rows, list) else rows
+    cols = np.concatenate(cols) if isinstance(cols, list) else cols
+    vals = np.concatenate(vals) if isinstance(vals, list) else vals
+    A = sp.csr_matrix((vals, (rows, cols)), shape=(n_rows, n_cols))
+    A.eliminate_zeros()
+    return A
+
+
+# Same model as build_two_index_model(subtour="mtz"), built with the matrix
+# API: all variables live in one MVar z = [x (n*n), u (n), k] and every
+# constraint family is a single sparse addMConstr call, so build time grows
+# with the number of nonzeros instead of with Python loop overhead.
+# Returns the model, x (MVar n x n), u (MVar n) and k. presolve works as in
+# build_two_index_model, except that the arcs it drops are fixed to 0.
+def build_two_index_mvar(c, demands, subset, Q, presolve=False):
+    build_start = time.perf_counter()
+    cs = instance_store.submatrix(c, subset).astype(np.float64)
+    ds = np.array([demands[i] for i in subset], dtype=np.float64)
+    n = len(subset)
+    D = n-1
+    nx = n*n
+    nz = nx + n + 1
+    X = lambda i, j: i*n + j
+    U = lambda i: nx + i
+    K = nz - 1
+    stops = np.arange(1, D)
+    usable = np.ones((n, n), dtype=bool)
+    lb = np.zeros(nz)
+    ub = np.concatenate((np.ones(nx), np.full(n, Q), [GRB.INFINITY]))
+    if presolve:
+        usable = vrp_presolve.usable_arcs(cs, ds, Q)
+        ub[:nx] = usable.ravel()
+        lb[nx:nx + n], ub[nx:nx + n] = vrp_presolve.load_bounds(ds, Q, usable)
+        lb[K] = vrp_presolve.fleet_bound(ds, Q)
+
+    m = gp.Model()
+
+    # VARIABLES: x[i,j] binary, u[i] in [0, Q] (see load_vtype), k integer
+    vtype = np.array([GRB.BINARY] * nx + [load_vtype(ds)] * n + [GRB.INTEGER])
+    z = m.addMVar(nz, vtype=vtype, lb=lb, ub=ub, name="z")
+    x = z[:nx].reshape(n, n)
+    u = z[nx:nx + n]
+    k = z[K]
+
+    # OBJECTIVE FUNCTION
+    m.setObjective(np.concatenate((cs.ravel(), np.zeros(n + 1))) @ z, GRB.MINIMIZE)
+
+    # RUN-TIME OPTIMIZATIONS
+    m.params.MIPFocus = 1
+
+    # CONSTRAINTS
+    # 1.1 / 1.2: every location (excluding depot) left / entered exactly once
+    i, j = np.meshgrid(stops, np.arange(1, n), indexing="ij")
+    A = sparse_rows(i.ravel() - 1, X(i, j).ravel(), np.ones(i.size), len(stops), nz)
+    m.addMConstr(A, z, "=", np.ones(len(stops)))
+    i, j = np.meshgrid(stops, np.arange(D), indexing="ij")
+    A = sparse_rows(i.ravel() - 1, X(j, i).ravel(), np.ones(i.size), len(stops), nz)
+    m.addMConstr(A, z, "=", np.ones(len(stops)))
+    # 1.3 / 1.4: the start depot is left and the end depot entered k times
+    out_O = np.arange(1, n)
+    in_D = np.arange(D)
+    A = sparse_rows([np.zeros(n-1), np.zeros(1), np.ones(n-1), np.ones(1)],
+                    [X(0, out_O), [K], X(in_D, D), [K]],
+                    [np.ones(n-1), [-1], np.ones(n-1), [-1]], 2, nz)
+    m.addMConstr(A, z, "=", np.zeros(2))
+
+    # 2.1: MTZ-Specific Subtour Elimination Constraints
+    i, j = np.meshgrid(stops, stops, indexing="ij")
+    off = (i != j) & usable[i, j]
+    i, j = i[off], j[off]
+    rows = np.arange(len(i))
+    A = sparse_rows([rows, rows, rows], [U(i), U(j), X(i, j)],
+                    [np.ones(len(i)), -np.ones(len(i)), np.full(len(i), Q)], len(i), nz)
+    m.addMConstr(A, z, "<", Q - ds[j])
+
+    # 2.2: capacity constraints (the bounds of u with presolve)
+    if not presolve:
+        A = sparse_rows(np.arange(n), U(np.arange(n)), np.ones(n), n, nz)
+        m.addMConstr(A, z, ">", ds)
+        m.addMConstr(A, z, "<", np.full(n, Q))
+
+    # 2.3: no self-loops
+    A = sparse_rows(np.arange(n), X(np.arange(n), np.arange(n)), np.ones(n), n, nz)
+    m.addMConstr(A, z, "=", np.zeros(n))
+
+    m.update()
+    m._build_time = time.perf_counter() - build_start
+    return m, x, u, k
+
+
+# Same model as build_three_index_model, built with the matrix API (see
+# build_two_index_mvar). z = [x (n*n*K), y (n*K), u (n*K)].
+# Returns the model, x (MVar n x n x K), y and u (MVar n x K).
+def build_three_index_mvar(c, demands, subset, Q, K, symmetry=None, presolve=False):
+    build_start = time.perf_counter()
+    cs = instance_store.submatrix(c, subset).astype(np.float64)
+    ds = np.array([demands[i] for i in subset], dtype=np.float64)
+    n = len(subset)
+    O = 0
+    D = n-1
+    nx = n*n*K
+    ny = n*K
+    nz = nx + 2*ny
+    X = lambda i, j, k: (i*n + j)*K + k
+    Y = lambda i, k: nx + i*K + k
+    U = lambda i, k: nx + ny + i*K + k
+    stops = np.arange(1, D)
+    vehicles = np.arange(K)
+    usable = np.ones((n, n), dtype=bool)
+    lb = np.zeros(nz)
+    ub = np.concatenate((np.ones(nx + ny), np.full(ny, Q)))
+    if presolve:
+        usable = vrp_presolve.usable_arcs(cs, ds, Q)
+        ub[:nx] = np.repeat(usable.ravel(), K)
+        load_lb, load_ub = vrp_presolve.load_bounds(ds, Q, usable)
+        lb[nx + ny:] = np.repeat(load_lb, K)
+        ub[nx + ny:] = np.repeat(load_ub, K)
+
+    m = gp.Model()
+
+    # VARIABLES: x_ijk and y_ik binary, u_ik in [0, Q] (see load_vtype)
+    vtype = np.array([GRB.BINARY] * (nx + ny) + [load_vtype(ds)] * ny)
+    z = m.addMVar(nz, vtype=vtype, lb=lb, ub=ub, name="z")
+    x = z[:nx].reshape(n, n, K)
+    y = z[nx:nx + ny].reshape(n, K)
+    u = z[nx + ny:].reshape(n, K)
+
+    # OBJECTIVE FUNCTION
+    costs = np.repeat(cs.ravel(), K)
+    m.setObjective(np.concatenate((costs, np.zeros(2*ny))) @ z, GRB.MINIMIZE)
+
+    # RUN-TIME OPTIMIZATIONS
+    m.params.MIPFocus = 1
+
+    # CONSTRAINTS
+    # 1.9: every location (not depot) visited exactly once
+    i, k = np.meshgrid(stops, vehicles, indexing="ij")
+    A = sparse_rows(i.ravel() - 1, Y(i, k).ravel(), np.ones(i.size), len(stops), nz)
+    m.addMConstr(A, z, "=", np.ones(len(stops)))
+    # 1.10.1 / 1.10.2: every location (not depot) left / entered exactly once
+    i, j, k = np.meshgrid(stops, np.arange(1, n), vehicles, indexing="ij")
+    A = sparse_rows(i.ravel() - 1, X(i, j, k).ravel(), np.ones(i.size), len(stops), nz)
+    m.addMConstr(A, z, "=", np.ones(len(stops)))
+    i, j, k = np.meshgrid(stops, np.arange(D), vehicles, indexing="ij")
+    A = sparse_rows(i.ravel() - 1, X(j, i, k).ravel(), np.ones(i.size), len(stops), nz)
+    m.addMConstr(A, z, "=", np.ones(len(stops)))
+    # 1.10.3 / 1.10.4: the start depot is left and the end depot entered once in each run
+    k, j = np.meshgrid(vehicles, np.arange(1, n), indexing="ij")
+    A = sparse_rows(k.ravel(), X(O, j, k).ravel(), np.ones(k.size), K, nz)
+    m.addMConstr(A, z, "=", np.ones(K))
+    k, i = np.meshgrid(vehicles, np.arange(D), indexing="ij")
+    A = sparse_rows(k.ravel(), X(i, D, k).ravel(), np.ones(k.size), K, nz)
+    m.addMConstr(A, z, "=", np.ones(K))
+    # sum of the ways into it minus the ways out is 0, one row per (k, i)
+    k, i, j = np.meshgrid(vehicles, stops, np.arange(D), indexing="ij")
+    row_in = (k*len(stops) + i - 1).ravel()
+    col_in = X(j, i, k).ravel()
+    k, i, j = np.meshgrid(vehicles, stops, np.arange(1, n), indexing="ij")
+    row_out = (k*len(stops) + i - 1).ravel()
+    col_out = X(i, j, k).ravel()
+    A = sparse_rows([row_in, row_out], [col_in, col_out],
+                    [np.ones(len(row_in)), -np.ones(len(row_out))], K*len(stops), nz)
+    m.addMConstr(A, z, "=", np.zeros(K*len(stops)))
+
+    # 1.11: y_ik = 1 if we leave the location, one row per (i, k)
+    i, k, j = np.meshgrid(stops, vehicles, np.arange(1, n), indexing="ij")
+    rows = ((i - 1)*K + k).ravel()
+    y_rows = ((stops[:, None] - 1)*K + vehicles[None, :]).ravel()
+    y_cols = Y(stops[:, None], vehicles[None, :]).ravel()
+    A = sparse_rows([y_rows, rows], [y_cols, X(i, j, k).ravel()],
+                    [np.ones(len(y_rows)), -np.ones(len(rows))], len(stops)*K, nz)
+    m.addMConstr(A, z, "=", np.zeros(len(stops)*K))
+
+    # 1.12: y_ok and y_dk = 1 always
+    A = sparse_rows(np.arange(2*K), np.concatenate((Y(O, vehicles), Y(D, vehicles))),
+                    np.ones(2*K), 2*K, nz)
+    m.addMConstr(A, z, "=", np.ones(2*K))
+
+    # 1.13: MTZ-Specific SEC
+    i, j, k = np.meshgrid(stops, stops, vehicles, indexing="ij")
+    off = (i != j) & usable[i, j]
+    i, j, k = i[off], j[off], k[off]
+    rows = np.arange(len(i))
+    A = sparse_rows([rows, rows, rows], [U(i, k), U(j, k), X(i, j, k)],
+                    [np.ones(len(i)), -np.ones(len(i)), np.full(len(i), Q)], len(i), nz)
+    m.addMConstr(A, z, "<", Q - ds[j])
+
+    # 1.14: capacity constraints (the bounds of u with presolve)
+    if not presolve:
+        i, k = np.meshgrid(np.arange(n), vehicles, indexing="ij")
+        A = sparse_rows(np.arange(ny), U(i, k).ravel(), np.ones(ny), ny, nz)
+        m.addMConstr(A, z, ">", ds[i.ravel()])
+        m.addMConstr(A, z, "<", np.full(ny, Q))
+    else:
+        # the stops need at least fleet_bound vehicles
+        A = sparse_rows(np.zeros(K), X(O, D, vehicles), np.ones(K), 1, nz)
+        m.addMConstr(A, z, "<", [K - vrp_presolve.fleet_bound(ds, Q)])
+
+    # 2.1: no self-loops
+    i, k = np.meshgrid(np.arange(n), vehicles, indexing="ij")
+    A = sparse_rows(np.arange(ny), X(i, i, k).ravel(), np.ones(ny), ny, nz)
+    m.addMConstr(A, z, "=", np.zeros(ny))
+
+    m.update()
+    add_symmetry_breaking(m, x, y, ds, K, symmetry)
+    m._build_time = time.perf_counter() - build_start
+    return m, x, y, u
+
+
+# Build and solve the model for one subset. formulation is "two_index",
+# "three_index" (one vehicle per location) or "set_partitioning" (colgen.py,
+# which only takes params). params are Gurobi parameters. start (global ids)
+# or, with warm_start, the savings routes are the MIP start. subtour,
+# vectorized, symmetry and presolve (None: off for lazy cuts) go to the
+# builders; aggregate solves "three_index" as "two_index"; knn/verify use
+# candidate_arcs/verify_arcs (the bound then holds for those arcs only);
+# resequence runs heuristics.resequence on the routes. Returns a dict with
+# the routes (global ids, None if none were found), objective, bound, gap,
+# runtime, build/extract times and model size.
+def solve_subset(c, demands, subset, Q, formulation="two_index", params=None,
+                 subtour="mtz", warm_start=True, vectorized=False, start=None,
+                 symmetry=None, aggregate=False, knn=None, verify=False, resequence=True,
+                 presolve=None):
+    if formulation == "set_partitioning":
+        return colgen.solve_subset(c, demands, Q, subset, params)
+    n = len(subset)
+    ds = [demands[i] for i in subset]
+    if formulation == "three_index" and aggregate:
+        # the trucks are identical, so the per-vehicle copies can go
+        formulation = "two_index"
+    if presolve is None:
+        # measured: it speeds up the MTZ models but makes lazy solves erratic
+        presolve = formulation == "three_index" or subtour == "mtz"
+    if start is not None:
+        warm_start = True
+        start = to_local(start, subset)
+    elif warm_start:
+        start = to_local(heuristics.savings_routes(c, demands, Q, subset), subset)
+    if presolve and warm_start:
+        cs = instance_store.submatrix(c, subset)
+        start = vrp_presolve.split_routes(start, vrp_presolve.usable_arcs(cs, ds, Q))
+    with quiet(params):
+        if formulation == "three_index":
+            if vectorized:
+                m, x, y, u = build_three_index_mvar(c, demands, subset, Q, n, symmetry, presolve)
+            else:
+                m, x, y, u = build_three_index_model(c, demands, subset, Q, n, symmetry, presolve)
+            if warm_start:
+                set_three_index_start(m, x, y, u, start, ds, n)
+        else:
+            if knn:
+                cs = instance_store.submatrix(c, subset)
+                arcs = candidate_arcs(cs, ds, Q, knn, start if warm_start else None)
+                if verify:
+                    arcs = verify_arcs(c, demands, subset, Q, arcs, subtour)
+                m, x, u, k = build_two_index_model(c, demands, subset, Q, subtour, arcs=arcs,
+                                                   presolve=presolve)
+            elif vectorized and subtour == "mtz":
+                m, x, u, k = build_two_index_mvar(c, demands, subset, Q, presolve)
+            else:
+                m, x, u, k = build_two_index_model(c, demands, subset, Q, subtour, presolve=presolve)
+            if warm_start:
+                set_two_index_start(m, x, u, k, start, ds)
+        for name, value in (params or {}).items():
+            m.setParam(name, value)
+
+    optimize(m)
+
+    result = {"subset": list(subset), "routes": None, "objective": None,
+              "bound": m.ObjBound, "gap": None, "runtime": m.Runtime,
+              "build_time": m._build_time, "extract_time": 0.0,
+              "variables": m.NumVars, "constraints": m.NumConstrs}
+    if m.SolCount > 0:
+        extract_start = time.perf_counter()
+        if formulation == "three_index":
+            routes = utility_final.build_vehicle_routes(x, n, n, 0, n-1, m)
+        else:
+            routes = utility_final.build_routes(x, n, 0, n-1, m)
+        result["objective"] = m.ObjVal
+        result["gap"] = m.MIPGap
+        if resequence:
+            cs = instance_store.submatrix(c, subset).astype(np.float64)
+            routes = heuristics.resequence(routes, cs)
+            cost = heuristics.routes_cost(routes, cs)
+            if cost < m.ObjVal:
+                result["objective"] = cost
+                result["gap"] = max(0.0, (cost - m.ObjBound) / cost) if cost > 0 else 0.0
+        result["routes"] = to_global(routes, subset)
+        result["extract_time"] = time.perf_counter() - extract_start
+    return result
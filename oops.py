@@ -1,6 +1,4 @@
-import matplotlib.pyplot as plt
 import os, json
-import utility
 import utility_final
 
 routes = [[0, 9, 4, 40, 26, 22, 125],
@@ -62,40 +60,5 @@ for route in routes:
     route[-1] = "Depot"
     print(" -> ".join(route))
 
-fig, axs = plt.subplots(2, 2, sharex=True, sharey=True)
-route_groups = list(utility.split(routes, 4))
-
-for plot_i, routes in enumerate(route_groups):
-    for route in routes:
-        route[-1] = 0
-        xs = [locations[i]["long"] for i in route]
-        ys = [locations[i]["lat"] for i in route]
-        axs[plot_i % 2, plot_i // 2].plot(xs, ys)
-#plt.axis('equal')
-#plt.show()
-
-
-
-for route in routes:
-    if len(route) >= 6 + 2:
-        route[-1] = 0
-        xs = [locations[i]["long"] for i in route]
-        ys = [locations[i]["lat"] for i in route]
-        plt.plot(xs, ys)
-plt.axis('equal')
-plt.show()
-
-
-for ci, route in enumerate(routes):
-    for i, j in zip(route[:-1], route[1:]):
-        i = i if i != D else 0
-        j = j if j != D else 0
-        xs = (locations[i]["long"], locations[j]["long"])
-        ys = (locations[i]["lat"], locations[j]["lat"])
-        plt.plot(xs, ys, c=ci, cmap="rainbow")
-    color_i = (color_i + 1) % len(color_cycle)
-
-
-plt.axis('equal')
-plt.legend()
-plt.show()
+utility_final.plot_4_groups_of_routes(routes, locations)
+utility_final.plot_all_routes(routes, locations)
@@ -0,0 +1,100 @@
+import os
+import inspect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import models
+import colgen
+import instrument
+from cache import subset_key
+
+"""
+Solve independent subsets (K-Means clusters) on a pool of worker processes.
+
+The machine's cores are split between the concurrent Gurobi models through
+the Threads parameter so that the models don't fight over cores. The largest
+subsets are submitted first: the run is limited by the slowest cluster, so it
+should start right away while the small clusters run next to it. Results are
+returned in the order of subsets, whatever order they finish in.
+
+Pass c as an instance_store.CostMatrix: it is sent to the workers as a
+reference to the memory-mapped file, so every worker reads the same pages
+instead of getting its own copy of the matrix.
+"""
+
+
+# Split cores between the subsets that run at the same time. If every subset
+# gets its own worker, cores are handed out in proportion to the model size
+# (which grows with n^2), otherwise they are split evenly between workers.
+def thread_budget(subsets, processes, cores):
+    if processes < len(subsets):
+        share = max(1, cores // processes)
+        return [share for _ in subsets]
+    weights = [len(s) ** 2 for s in subsets]
+    total = sum(weights)
+    return [max(1, (cores * w) // total) for w in weights]
+
+
+# Every keyword argument solve_subset runs with, its defaults filled in (and
+# those of colgen.solve_subset, which the set-partitioning formulation uses),
+# so that a cache entry stops matching once a default changes
+def solver_options(formulation, params, options):
+    effective = {}
+    for function in (models.solve_subset, colgen.solve_subset):
+        for name, parameter in inspect.signature(function).parameters.items():
+            # subset and params are passed on to colgen by models.solve_subset
+            if parameter.default is not inspect.Parameter.empty and name not in ("subset", "params"):
+                effective[f"{function.__module__}.{name}"] = parameter.default
+    for name, value in {"formulation": formulation, "params": params or {}, **options}.items():
+        effective[f"models.{name}"] = value
+    return effective
+
+
+# Solve every subset with models.solve_subset and return the results in the
+# same order as subsets. processes=1 solves them one after another in this
+# process (the old behaviour). With a cache.SubsetCache, subsets solved
+# before with the same inputs are replayed from disk (their result has
+# "cached": True) and only the rest are solved. The times and model sizes of
+# every result are added to the instrument report. options are passed on to
+# solve_subset as keyword arguments (e.g. symmetry=...).
+def solve_subsets(c, demands, subsets, Q, formulation="two_index", params=None,
+                  processes=None, cores=None, cache=None, options=None):
+    options = options or {}
+    results = [None] * len(subsets)
+    keys = [None] * len(subsets)
+    if cache is not None:
+        key_options = solver_options(formulation, params, options)
+        for s, subset in enumerate(subsets):
+            keys[s] = subset_key(c, demands, subset, Q, key_options)
+            hit = cache.get(keys[s])
+            if hit is not None:
+                hit["cached"] = True
+                results[s] = hit
+    todo = [s for s in range(len(subsets)) if results[s] is None]
+
+    if processes == 1 or len(todo) <= 1:
+        for s in todo:
+            results[s] = models.solve_subset(c, demands, subsets[s], Q, formulation, params, **options)
+    else:
+        cores = cores or os.cpu_count() or 1
+        processes = min(processes or cores, len(todo))
+        todo_subsets = [subsets[s] for s in todo]
+        threads = dict(zip(todo, thread_budget(todo_subsets, processes, cores)))
+        order = sorted(todo, key=lambda s: len(subsets[s]), reverse=True)
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {}
+            for s in order:
+                subset_params = dict(params or {})
+                subset_params["Threads"] = threads[s]
+                future = pool.submit(models.solve_subset, c, demands, subsets[s], Q,
+                                     formulation, subset_params, **options)
+                futures[future] = s
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+    if cache is not None:
+        for s in todo:
+            if results[s]["routes"] is not None:
+                cache.put(keys[s], results[s])
+    for result in results:
+        instrument.record_result(result)
+    return results
@@ -0,0 +1,81 @@
+import math
+import numpy as np
+
+"""
+Presolve for the VRP models in models.py. Everything here works on the local
+arrays of one subset (travel times cs, demands ds, the depot at 0 and n-1)
+and only removes structure no optimal solution needs:
+
+  fleet bound   - the stops need at least ceil(sum d / Q) trucks (a
+                  bin-packing bound), so k >= that in the two-index model and
+                  at most K minus that many vehicles drive O -> D in the
+                  three-index model
+  capacity arcs - a truck can't serve i and then j if d_i + d_j > Q
+  triangle arcs - if c[i,j] > c[i,D] + c[O,j], a route using i -> j gets
+                  cheaper by going back to the depot in between. Splitting it
+                  there needs one more truck, which the models always have
+                  (k is free, and K = n is more than the number of stops).
+                  The arcs into O and out of D are never used either.
+  load bounds   - u_i lies in [d_i, Q] for every stop (the 2.2 / 1.14 rows
+                  become bounds), and u_i = d_i when no stop can come before
+                  i. The depots have no MTZ rows, so their u is fixed to 0.
+"""
+
+
+# Fewest trucks that can carry the demands of the stops: ceil(sum d / Q)
+def fleet_bound(ds, Q):
+    total = float(np.sum(ds[1:-1]))
+    return math.ceil(total / Q - 1e-9) if total > 0 else 0
+
+
+# Arcs the models still need, as a boolean matrix usable[i, j]; the others
+# can be left out or fixed to 0 (see above)
+def usable_arcs(cs, ds, Q, eps=1e-9):
+    cs = np.asarray(cs, dtype=np.float64)
+    ds = np.asarray(ds, dtype=np.float64)
+    n = len(ds)
+    D = n-1
+    usable = np.ones((n, n), dtype=bool)
+    np.fill_diagonal(usable, False)
+    usable[:, 0] = False
+    usable[D, :] = False
+    within = ds[1:D, None] + ds[None, 1:D] <= Q + eps
+    shorter = cs[1:D, 1:D] <= cs[1:D, D][:, None] + cs[0, 1:D][None, :] + eps
+    usable[1:D, 1:D] &= within & shorter
+    return usable
+
+
+# Bounds (lb, ub) of the load variables u
+def load_bounds(ds, Q, usable):
+    ds = np.asarray(ds, dtype=np.float64)
+    n = len(ds)
+    lb = ds.copy()
+    ub = np.full(n, float(Q))
+    first_only = ~usable[1:n-1, 1:n-1].any(axis=0)
+    ub[1:n-1][first_only] = lb[1:n-1][first_only]
+    lb[0] = lb[n-1] = ub[0] = ub[n-1] = 0
+    return lb, ub
+
+
+# Split routes (local indices, or global ids with a global ds) so a warm start
+# stays feasible: a new route starts before a stop whenever the arc to it is
+# one usable leaves out, or when the truck would carry more than Q with
+# demands ds. Routes within Q only ever lose triangle arcs, and each split
+# makes them cheaper. Routes left without stops are dropped.
+def split_routes(routes, usable=None, ds=None, Q=None):
+    result = []
+    for route in routes:
+        current = [route[0]]
+        load = 0
+        for i in route[1:-1]:
+            cut = ((usable is not None and not usable[current[-1], i])
+                   or (ds is not None and load + ds[i] > Q))
+            if cut and len(current) > 1:
+                result.append(current + [route[-1]])
+                current = [route[0]]
+                load = 0
+            current.append(i)
+            if ds is not None:
+                load += ds[i]
+        result.append(current + [route[-1]])
+    return [route for route in result if len(route) > 2]
@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
+"""
+Route drawing that scales to thousands of segments and runs without a
+display. All arcs of a plot are gathered into one array and drawn as a single
+LineCollection (colored per route), instead of one ax.plot call per route or
+per arc. render_routes() draws on a bare matplotlib Figure, which renders
+with Agg and never touches pyplot or a GUI backend, and writes the image
+(PNG, SVG, PDF, ... picked by the file extension). render_batch() renders
+many solutions on a process pool.
+
+utility_final.plot_all_routes and plot_4_groups_of_routes use the same
+drawing; they show the plot as before, or write it when given a filename.
+"""
+
+COLORS = ["b", "g", "r", "c", "m", "y", "k"]
+
+
+# Line segments of every arc of routes as an (arcs, 2, 2) array of
+# (long, lat) pairs, plus the route each segment belongs to. Location ids
+# past the last location (the end depot D) wrap around to the depot.
+def route_segments(routes, locations):
+    if hasattr(locations, "dtype"):
+        points = np.column_stack((locations["long"], locations["lat"]))
+    else:
+        points = np.array([(loc["long"], loc["lat"]) for loc in locations])
+    routes = [route for route in routes if len(route) > 1]
+    if not routes:
+        return np.zeros((0, 2, 2)), np.zeros(0, dtype=np.intp)
+    nodes = np.concatenate(routes) % len(points)
+    lengths = np.array([len(route) for route in routes])
+    ends = np.cumsum(lengths) - 1  # last node of every route starts no arc
+    starts = np.delete(np.arange(len(nodes) - 1), ends[:-1])
+    segments = np.stack((points[nodes[starts]], points[nodes[starts + 1]]), axis=1)
+    route_of = np.repeat(np.arange(len(routes)), lengths - 1)
+    return segments, route_of
+
+
+# Draw routes on ax as one LineCollection, with the depot marked. equal keeps
+# long/lat at the same scale (not possible on shared axes).
+def draw_routes(ax, routes, locations, title=None, linewidth=1.0, equal=True):
+    segments, route_of = route_segments(routes, locations)
+    colors = [COLORS[r % len(COLORS)] for r in route_of]
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=linewidth))
+    ax.plot(locations[0]["long"], locations[0]["lat"], "k*", markersize=10)
+    ax.autoscale_view()
+    if equal:
+        ax.set_aspect("equal", adjustable="datalim")
+    if title:
+        ax.set_title(title)
+
+
+# Draw routes on fig, in groups evenly sized groups (1 or 4, laid out 2x2)
+def draw_figure(fig, routes, locations, title=None, groups=1):
+    if groups == 1:
+        draw_routes(fig.add_subplot(), routes, locations, title)
+        return fig
+    axs = fig.subplots(2, groups // 2, sharex=True, sharey=True, squeeze=False)
+    k, m = divmod(len(routes), groups)
+    for g in range(groups):
+        group = routes[g*k + min(g, m):(g+1)*k + min(g+1, m)]
+        draw_routes(axs[g % 2, g // 2], group, locations, equal=False)
+    if title:
+        fig.suptitle(title)
+    return fig
+
+
+# Write the routes to filename without a display. The format comes from the
+# extension (.png, .svg, ...).
+def render_routes(routes, locations, filename, title=None, groups=1, size=(8, 8), dpi=150):
+    fig = Figure(figsize=size)
+    draw_figure(fig, routes, locations, title, groups)
+    fig.savefig(filename, dpi=dpi)
+    return filename
+
+
+def _render_job(job):
+    return render_routes(**job)
+
+
+# Render a batch of solutions, each job a dict of render_routes arguments
+# (routes, locations, filename, ...), on processes worker processes.
+# Returns the filenames in job order.
+def render_batch(jobs, processes=None):
+    jobs = list(jobs)
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_render_job, jobs))
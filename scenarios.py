@@ -0,0 +1,143 @@
+import time
+import argparse
+import numpy as np
+import instance_store
+import utility_final
+import models
+import heuristics
+import presolve
+
+"""
+Solve many demand scenarios (weekday variants, holiday surges, ...) over the
+same locations and travel times. Only the demands change between scenarios,
+and in the two-index model they only show up in a few places:
+
+  mtz   - the MTZ rows u_i - u_j + Q x_ij <= Q - d_j (their right-hand sides)
+  load  - the rows u_i >= d_i
+  k     - the fleet bound ceil(sum d / Q) (presolve.fleet_bound, MTZ only)
+
+so each subset's model is built once and every scenario just updates those
+numbers and re-optimizes. Gurobi keeps the LP basis of the previous solve for
+the root, and the previous scenario's routes (split where the new demands go
+over Q) are loaded as the MIP start. With subtour="lazy" the model has no
+demand rows at all and only the callback's demands change; Gurobi can't see
+that change, so the model is reset first (or it would hand back the previous
+scenario's solution).
+
+The demand-dependent presolve reductions (capacity arcs, load bounds) can't
+be used here, since the arcs they drop differ between scenarios.
+
+    python scenarios.py weekday.csv friday.csv holiday.csv
+
+solves every demands CSV (same layout as data/FBWMLocationsDemands.csv) on
+the clusters of the first one and prints a table with one row per scenario.
+"""
+
+
+# Update a built two-index model to the demands ds (local indices).
+# mtz_rows holds (j, row) pairs and load_rows the rows u_i >= d_i.
+def set_demands(m, u, k, ds, Q, mtz_rows, load_rows):
+    if u is not None:
+        m.setAttr("RHS", [row for _, row in mtz_rows], [Q - ds[j] for j, _ in mtz_rows])
+        m.setAttr("RHS", load_rows, list(ds))
+        m.setAttr("VType", list(u.values()), [models.load_vtype(ds)] * len(ds))
+        k.LB = presolve.fleet_bound(np.asarray(ds, dtype=np.float64), Q)
+    else:
+        m._ds = ds
+        m.reset()
+
+
+# Solve one subset for every demand vector in scenarios (each indexed by
+# global location id) with a single two-index model. params are Gurobi
+# parameters and subtour is passed on to models.build_two_index_model.
+# Returns one entry per scenario, in order: routes (global ids), objective,
+# bound, gap, runtime (solver seconds) and update_time (seconds spent
+# changing the model and loading the start).
+def solve_scenarios(c, scenarios, subset, Q, params=None, subtour="mtz", warm_start=True):
+    n = len(subset)
+    with models.quiet(params):
+        m, x, u, k = models.build_two_index_model(c, scenarios[0], subset, Q, subtour)
+        for name, value in (params or {}).items():
+            m.setParam(name, value)
+    rows = {row.ConstrName: row for row in m.getConstrs()}
+    mtz_rows = [(j, rows[f"mtz[{i},{j}]"]) for i in range(1, n-1) for j in range(1, n-1)
+                if f"mtz[{i},{j}]" in rows]
+    load_rows = [rows[f"load[{i}]"] for i in range(n)] if u is not None else []
+
+    entries = []
+    routes = None
+    for demands in scenarios:
+        update_start = time.perf_counter()
+        ds = [demands[i] for i in subset]
+        set_demands(m, u, k, ds, Q, mtz_rows, load_rows)
+        if warm_start:
+            if routes is None:
+                start = models.to_local(heuristics.savings_routes(c, demands, Q, subset), subset)
+            else:
+                start = presolve.split_routes(routes, ds=ds, Q=Q)
+            models.set_two_index_start(m, x, u, k, start, ds)
+        update_time = time.perf_counter() - update_start
+
+        models.optimize(m)
+        entry = {"routes": None, "objective": None, "bound": m.ObjBound, "gap": None,
+                 "runtime": m.Runtime, "update_time": update_time}
+        if m.SolCount > 0:
+            routes = utility_final.build_routes(x, n, 0, n-1, m)
+            for route in routes:
+                if sum(ds[i] for i in route) > Q + 1e-9:
+                    raise ValueError(f"route {models.to_global([route], subset)[0]} carries more than Q")
+            entry["routes"] = models.to_global(routes, subset)
+            entry["objective"] = m.ObjVal
+            entry["gap"] = m.MIPGap
+        entries.append(entry)
+    return entries
+
+
+# solve_scenarios for every subset, put together per scenario. Returns one
+# row per scenario: routes, objective, bound and runtime summed over the
+# subsets, plus the build-once update time. A scenario with no routes for
+# some subset gets objective None.
+def solve_batch(c, scenarios, subsets, Q, params=None, subtour="mtz"):
+    table = [{"routes": [], "objective": 0.0, "bound": 0.0, "runtime": 0.0, "update_time": 0.0}
+             for _ in scenarios]
+    for subset in subsets:
+        for row, entry in zip(table, solve_scenarios(c, scenarios, subset, Q, params, subtour)):
+            row["bound"] += entry["bound"]
+            row["runtime"] += entry["runtime"]
+            row["update_time"] += entry["update_time"]
+            if entry["routes"] is None or row["objective"] is None:
+                row["objective"] = None
+            else:
+                row["routes"] += entry["routes"]
+                row["objective"] += entry["objective"]
+    return table
+
+
+def print_table(table, names):
+    print("Scenario | Routes | Objective | Bound | Gap | Solver time | Update time")
+    for name, row in zip(names, table):
+        if row["objective"] is None:
+            print(f"{name} | - | - | {row['bound']:.0f} | - | {row['runtime']:.1f}s | {row['update_time']:.2f}s")
+            continue
+        gap = (row["objective"] - row["bound"]) / row["objective"] if row["objective"] else 0.0
+        print(f"{name} | {len(row['routes'])} | {row['objective']:.0f} | {row['bound']:.0f} | "
+              f"{100 * gap:.2f}% | {row['runtime']:.1f}s | {row['update_time']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve several demand scenarios")
+    parser.add_argument("demands", nargs="+", help="demands CSV files, one per scenario")
+    parser.add_argument("--max-stops", type=int, default=25)
+    parser.add_argument("--max-demand", type=float, default=60)
+    parser.add_argument("--time-limit", type=float, default=30, help="seconds per subset and scenario")
+    parser.add_argument("--subtour", default="mtz", choices=["mtz", "lazy"])
+    args = parser.parse_args()
+
+    locations, c, _ = instance_store.load_instance()
+    N_LOCS = len(locations) + 1
+    Q = 12
+    scenarios = [utility_final.get_demands(N_LOCS, filename, locations) for filename in args.demands]
+    subsets = utility_final.get_subsets3(locations, c, scenarios[0], args.max_demand, args.max_stops)
+    table = solve_batch(c, scenarios, subsets, Q, {"OutputFlag": 0, "TimeLimit": args.time_limit},
+                        args.subtour)
+    print_table(table, args.demands)
@@ -0,0 +1,110 @@
+import time
+import models
+import heuristics
+import instrument
+
+"""
+Solve a set of subsets within one wall-clock budget. Without it every
+cluster gets an unbounded solve and one big cluster can take hours while the
+rest finish in seconds.
+
+The first pass gives every cluster a share of part of the budget (in
+proportion to its model size, n^2) with the target gap as MIPGap. The time
+left over, from clusters that reached the target early and from the part held
+back, then goes to the clusters with the worst gaps: each is re-solved from
+its best routes so far, one after another, until every cluster is within the
+target gap or the budget is spent. Clusters whose solve can't prove a bound
+(set partitioning with heuristic pricing) are solved once only, since another
+run would generate the same columns and end on the same gap. Every cluster
+keeps its best objective and best bound over all its solves. A cluster that
+never finds a solution falls back to the savings + local search routes, so
+the run always ends on time with a complete plan.
+"""
+
+
+def gap(entry):
+    if entry["objective"] is None:
+        return float("inf")
+    if entry["objective"] == 0:
+        return 0.0
+    return max(0.0, (entry["objective"] - entry["bound"]) / entry["objective"])
+
+
+# Fold one solve_subset result into the cluster's entry
+def merge_result(entry, result):
+    entry["solves"] += 1
+    entry["runtime"] += result["runtime"]
+    entry["bound"] = max(entry["bound"], result["bound"])
+    if result["routes"] is not None and (entry["objective"] is None
+                                         or result["objective"] < entry["objective"]):
+        entry["routes"] = result["routes"]
+        entry["objective"] = result["objective"]
+        entry["source"] = "mip"
+    entry["gap"] = gap(entry)
+
+
+# Solve subsets (each [O, ..., D]) within budget seconds. target_gap is the
+# relative gap a cluster has to reach, first_share the part of the budget
+# handed out in the first pass and min_slice the shortest solve worth
+# starting. subtour and params are passed on to models.solve_subset.
+# Returns one entry per subset, in order: subset, routes (global ids),
+# objective, bound, gap, runtime (solver seconds), solves and source ("mip",
+# or "heuristic" if no solve found routes).
+def solve_on_budget(c, demands, subsets, Q, budget, target_gap=0.01, formulation="two_index",
+                    params=None, subtour="mtz", first_share=0.6, min_slice=1.0):
+    deadline = time.perf_counter() + budget
+    entries = [{"subset": list(subset), "routes": None, "objective": None, "bound": 0.0,
+                "gap": float("inf"), "runtime": 0.0, "solves": 0, "source": None}
+               for subset in subsets]
+    settled = set()
+
+    def solve(s, time_limit):
+        entry = entries[s]
+        subset_params = dict(params or {})
+        subset_params["TimeLimit"] = time_limit
+        subset_params["MIPGap"] = target_gap
+        result = models.solve_subset(c, demands, entry["subset"], Q, formulation, subset_params,
+                                     subtour, start=entry["routes"])
+        instrument.record_result(result)
+        merge_result(entry, result)
+        if not result.get("proven", True):
+            settled.add(s)
+
+    # first pass: a share of the budget each, biggest clusters first
+    weights = [len(subset) ** 2 for subset in subsets]
+    shares = [first_share * budget * w / sum(weights) for w in weights]
+    for s in sorted(range(len(subsets)), key=lambda s: -weights[s]):
+        remaining = deadline - time.perf_counter()
+        if remaining < min_slice:
+            break
+        solve(s, max(min_slice, min(shares[s], remaining)))
+
+    # then the leftover time, worst gap first
+    while True:
+        open_clusters = [s for s in range(len(entries))
+                         if entries[s]["gap"] > target_gap and s not in settled]
+        remaining = deadline - time.perf_counter()
+        if not open_clusters or remaining < min_slice:
+            break
+        # ties (e.g. no bound yet) go to the cluster solved the fewest times
+        s = max(open_clusters, key=lambda s: (entries[s]["gap"], -entries[s]["solves"]))
+        solve(s, max(min_slice, remaining / len(open_clusters)))
+
+    for entry in entries:
+        if entry["routes"] is None:
+            entry["routes"] = heuristics.solve(c, demands, Q, entry["subset"])
+            cs, _, subset = heuristics.local_arrays(c, demands, entry["subset"])
+            entry["objective"] = heuristics.routes_cost(models.to_local(entry["routes"], subset), cs)
+            entry["source"] = "heuristic"
+            entry["gap"] = gap(entry)
+    return entries
+
+
+def print_report(entries):
+    print("Cluster | Stops | Objective | Bound | Gap | Solver time | Solves | Source")
+    for s, entry in enumerate(entries):
+        print(f"{s} | {len(entry['subset']) - 2} | {entry['objective']:.0f} | {entry['bound']:.0f} | "
+              f"{100 * entry['gap']:.2f}% | {entry['runtime']:.1f}s | {entry['solves']} | {entry['source']}")
+    objective = sum(entry["objective"] for entry in entries)
+    bound = sum(entry["bound"] for entry in entries)
+    print(f"Total: {objective:.0f} (bound {bound:.0f}, gap {100 * (objective - bound) / objective:.2f}%)")
@@ -0,0 +1,183 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+import instance_store
+
+"""
+Synthetic instances in the same files as the real one, for testing the
+clustering and solving code at sizes well past our 124 stops:
+
+  locations.json             list of {loc_id, title, type, street1, city,
+                             zip, state, long, lat}; the warehouse is loc_id 0
+  travel_times_matrix.json   seconds, square, row/col i is loc_id i
+  distances_matrix.json      meters, same layout
+  FBWMLocationsDemands.csv   two header rows, then one row per stop with the
+                             pallets in column 6 (what get_demands reads)
+
+Stops are scattered around the towns our agencies are in, weighted roughly
+like the real data, with the depot at the Hatfield warehouse. Road distances
+are the great-circle distance times a detour factor and travel times assume
+an average road speed; both get a little seeded noise, so the matrices are
+asymmetric like the real ones. Everything is drawn from numpy generators
+seeded with seed, so the same arguments always give the same files.
+
+The matrices are computed a block of rows at a time, so generating 10,000
+stops never holds more than a few blocks in memory. At those sizes the JSON
+matrices get very large; pass store=True (--store) to also write the .npy
+store that instance_store.load_instance() reads directly, or json=False
+(--no-json) to write only the store.
+
+    python synthetic.py --stops 2000 --seed 1 --out data/synthetic_2000 --store
+"""
+
+DEPOT = {"loc_id": 0.0, "title": "FBWM - Warehouse", "type": "Warehouse",
+         "street1": "97 North Hatfield Rd", "city": "Hatfield", "zip": "01038",
+         "state": "MA", "long": -72.61476460017975, "lat": 42.39801299365277}
+
+# (city, zip, lat, long, share of the stops)
+TOWNS = [
+    ("Springfield", "01103", 42.1015, -72.5898, 0.25),
+    ("Holyoke", "01040", 42.2043, -72.6162, 0.12),
+    ("Chicopee", "01013", 42.1487, -72.6079, 0.07),
+    ("Westfield", "01085", 42.1251, -72.7495, 0.06),
+    ("West Springfield", "01089", 42.1070, -72.6204, 0.05),
+    ("Northampton", "01060", 42.3251, -72.6412, 0.07),
+    ("Amherst", "01002", 42.3732, -72.5199, 0.07),
+    ("Hatfield", "01038", 42.3709, -72.5984, 0.03),
+    ("Easthampton", "01027", 42.2668, -72.6690, 0.04),
+    ("Greenfield", "01301", 42.5876, -72.5995, 0.06),
+    ("Ware", "01082", 42.2598, -72.2398, 0.03),
+    ("Pittsfield", "01201", 42.4501, -73.2454, 0.05),
+    ("North Adams", "01247", 42.7009, -73.1087, 0.03),
+    ("Great Barrington", "01230", 42.1959, -73.3620, 0.03),
+    ("Southwick", "01077", 42.0548, -72.7704, 0.03),
+]
+STOP_TYPES = ["Agency", "Brown Bag", "Mobile Food Bank"]
+STOP_TYPE_SHARES = [0.35, 0.4, 0.25]
+PALLET_SHARES = [0.3, 0.25, 0.2, 0.12, 0.08, 0.05]  # 1 to 6 pallets
+
+TOWN_SPREAD = 3000.0  # meters, standard deviation around a town center
+DETOUR = 1.3          # road distance / great-circle distance
+SPEED = 17.0          # meters per second, average over the trip
+NOISE = 0.1           # standard deviation of the log of the per-arc noise
+EARTH_RADIUS = 6371000.0
+BLOCK_ROWS = 512
+
+
+# Location dicts (depot first, then n_stops stops, then n_pickups pick-ups at
+# the end like in the real file) and the demand of every stop
+def generate_locations(n_stops, seed=0, n_pickups=0):
+    rng = np.random.default_rng(seed)
+    n = n_stops + n_pickups
+    shares = np.array([town[4] for town in TOWNS])
+    town = rng.choice(len(TOWNS), size=n, p=shares / shares.sum())
+    centers = np.array([(t[2], t[3]) for t in TOWNS])[town]
+    offset = rng.normal(scale=TOWN_SPREAD, size=(n, 2)) / EARTH_RADIUS
+    lat = centers[:, 0] + np.degrees(offset[:, 0])
+    long = centers[:, 1] + np.degrees(offset[:, 1]) / np.cos(np.radians(centers[:, 0]))
+    kind = rng.choice(len(STOP_TYPES), size=n_stops, p=STOP_TYPE_SHARES)
+    demands = rng.choice(len(PALLET_SHARES), size=n_stops, p=PALLET_SHARES) + 1
+
+    locations = [dict(DEPOT)]
+    for i in range(n):
+        city, zip_code = TOWNS[town[i]][:2]
+        stop_type = STOP_TYPES[kind[i]] if i < n_stops else "Pick-up"
+        locations.append({"loc_id": float(i + 1), "title": f"Synthetic {stop_type} {i + 1}",
+                          "type": stop_type, "street1": "", "city": city, "zip": zip_code,
+                          "state": "MA", "long": float(long[i]), "lat": float(lat[i])})
+    return locations, demands.tolist()
+
+
+# Distances (meters) and travel times (seconds) from rows to every location,
+# as int32 arrays. Each block gets its own generator seeded from (seed, first
+# row), so the result doesn't depend on which blocks are computed.
+def matrix_block(lat, long, rows, seed=0):
+    phi = np.radians(lat)
+    lam = np.radians(long)
+    dphi = phi[rows, None] - phi[None, :]
+    dlam = lam[rows, None] - lam[None, :]
+    h = np.sin(dphi / 2)**2 + np.cos(phi[rows, None]) * np.cos(phi[None, :]) * np.sin(dlam / 2)**2
+    meters = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(h)) * DETOUR
+
+    rng = np.random.default_rng([seed, rows.start])
+    distance = meters * rng.lognormal(sigma=NOISE, size=meters.shape)
+    time = meters / SPEED * rng.lognormal(sigma=NOISE, size=meters.shape)
+    diagonal = (np.arange(len(rows)), np.arange(rows.start, rows.stop))
+    distance[diagonal] = 0
+    time[diagonal] = 0
+    return distance.round().astype(np.int32), time.round().astype(np.int32)
+
+
+def blocks(n):
+    return [range(a, min(a + BLOCK_ROWS, n)) for a in range(0, n, BLOCK_ROWS)]
+
+
+# Write a synthetic instance to out_dir (see the module docstring)
+def write_instance(out_dir, n_stops, seed=0, n_pickups=0, json_files=True, store=False):
+    os.makedirs(out_dir, exist_ok=True)
+    locations, demands = generate_locations(n_stops, seed, n_pickups)
+    lat = np.array([loc["lat"] for loc in locations])
+    long = np.array([loc["long"] for loc in locations])
+    n = len(locations)
+
+    with open(os.path.join(out_dir, "FBWMLocationsDemands.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["FBWM Locations Demands", "", "", "", "", "", ""])
+        writer.writerow(["loc_id", "title", "type", "street1", "city", "zip", "pallets"])
+        for loc, pallets in zip(locations[1:], demands):
+            writer.writerow([int(loc["loc_id"]), loc["title"], loc["type"], loc["street1"],
+                             loc["city"], loc["zip"], pallets])
+
+    outputs = []
+    if json_files:
+        json.dump(locations, open(os.path.join(out_dir, "locations.json"), "w"))
+        for name in ("distances_matrix.json", "travel_times_matrix.json"):
+            f = open(os.path.join(out_dir, name), "w")
+            f.write("[")
+            outputs.append(f)
+    if store:
+        store_dir = os.path.join(out_dir, "store")
+        os.makedirs(store_dir, exist_ok=True)
+        keep = n_stops + 1  # the store drops the pick-ups, which come last
+        records = np.zeros(keep, dtype=instance_store.LOCATION_DTYPE)
+        for r in range(keep):
+            records[r] = tuple(locations[r].get(name, "") for name in instance_store.LOCATION_DTYPE.names)
+        stored = [np.lib.format.open_memmap(os.path.join(store_dir, name), mode="w+",
+                                            dtype=np.int32, shape=(keep, keep))
+                  for name in (instance_store.DISTANCES_FILE, instance_store.TRAVEL_TIMES_FILE)]
+
+    for rows in blocks(n):
+        matrices = matrix_block(lat, long, rows, seed)
+        for f, matrix in zip(outputs, matrices):
+            lines = ["[" + ", ".join(map(str, row)) + "]" for row in matrix.tolist()]
+            f.write((", " if rows.start else "") + ", ".join(lines))
+        if store and rows.start < keep:
+            for memmap, matrix in zip(stored, matrices):
+                memmap[rows.start:min(rows.stop, keep)] = matrix[:keep - rows.start, :keep]
+
+    for f in outputs:
+        f.write("]")
+        f.close()
+    # the store goes last: instance_store.store_is_stale compares its
+    # modification times with the JSON files'
+    if store:
+        for memmap in stored:
+            memmap.flush()
+        np.save(os.path.join(store_dir, instance_store.LOCATIONS_FILE), records)
+        for name in (instance_store.DISTANCES_FILE, instance_store.TRAVEL_TIMES_FILE):
+            os.utime(os.path.join(store_dir, name))
+    return locations, demands
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic routing instance")
+    parser.add_argument("--stops", type=int, required=True)
+    parser.add_argument("--pickups", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--store", action="store_true", help="also write the .npy store")
+    parser.add_argument("--no-json", action="store_true", help="skip the JSON files")
+    args = parser.parse_args()
+    write_instance(args.out, args.stops, args.seed, args.pickups, not args.no_json, args.store or args.no_json)
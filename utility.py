@@ -1,8 +1,8 @@
-import csv
 from posixpath import split
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 import math
+import utility_final
 
 # split xy_locs into two groupings
 # recurse on a grouping of size greater than 40
@@ -97,19 +97,6 @@ def split(a, n):
     k, m = divmod(len(a), n)
     return (a[i*k+min(i, m):(i+1)*k+min(i+1, m)] for i in range(n))
 
+# Same as utility_final.get_demands (parsed once, matched by loc_id)
 def get_demands(N_LOCS):
-    demands = [0]
-    with open("data/FBWMLocationsDemands.csv") as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        line_count = 0
-        for row in csv_reader:
-            if len(demands) >= N_LOCS-1: break
-            if line_count == 0 or line_count == 1:
-                line_count += 1
-                continue
-            else:
-                demands.append(int(row[6][0]))
-                if demands[-1] == 0: demands[-1] = 1
-            line_count += 1
-    demands.append(0)
-    return demands
\ No newline at end of file
+    return utility_final.get_demands(N_LOCS)
\ No newline at end of file
@@ -1,69 +1,168 @@
+import os
+import re
 import csv
+import itertools
 from posixpath import split
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 import math
+import numpy as np
+import render
+import instance_store
 
 
-def get_demands(N_LOCS):
+DEMANDS_FILE = os.path.join("data", "FBWMLocationsDemands.csv")
+_demand_tables = {}
+
+# Pallets per loc_id from the demands CSV (two header rows, loc_id in column
+# 0, pallets in column 6). The file is parsed once per process; it is read
+# again only if it changes on disk. Pallets can be any number ("10", "2.5");
+# a stop without a number, or with 0, still gets 1 pallet.
+def demand_table(filename=DEMANDS_FILE):
+    key = (os.path.abspath(filename), os.path.getmtime(filename))
+    if key not in _demand_tables:
+        table = {}
+        with open(filename) as csv_file:
+            csv_reader = csv.reader(csv_file, delimiter=',')
+            for row in itertools.islice(csv_reader, 2, None):
+                if not row or not row[0].strip():
+                    continue
+                pallets = re.match(r"\s*(\d+(\.\d*)?|\.\d+)", row[6])
+                pallets = float(pallets.group(1)) if pallets else 0.0
+                if pallets.is_integer():
+                    pallets = int(pallets)
+                table[float(row[0])] = pallets or 1
+        _demand_tables[key] = table
+    return _demand_tables[key]
+
+# demands[i] is the pallets of model location i (0 for the depots O and D),
+# found by loc_id, so the order of the CSV rows doesn't matter. locations are
+# the N_LOCS-1 locations the model uses (O and the stops); by default they
+# are read from the store next to filename.
+def get_demands(N_LOCS, filename=DEMANDS_FILE, locations=None):
+    if locations is None:
+        data_dir = os.path.dirname(filename)
+        locations = instance_store.load_instance(N_LOCS-1, data_dir, os.path.join(data_dir, "store"))[0]
+    table = demand_table(filename)
     demands = [0]
-    with open("data/FBWMLocationsDemands.csv") as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        line_count = 0
-        for row in csv_reader:
-            if len(demands) >= N_LOCS-1: break
-            if line_count == 0 or line_count == 1:
-                line_count += 1
-                continue
-            else:
-                demands.append(int(row[6][0]))
-                if demands[-1] == 0: demands[-1] = 1
-            line_count += 1
+    for loc in locations[1:N_LOCS-1]:
+        loc_id = float(loc["loc_id"])
+        if loc_id not in table:
+            raise ValueError(f"no demand for loc_id {loc_id:g} in {filename}")
+        demands.append(table[loc_id])
     demands.append(0)
     return demands
 
-def build_routes(x, N_LOCS, O, D):
+# Routes stored back to back in one array: route r is
+# nodes[offsets[r]:offsets[r+1]]. tolist() gives the usual list of lists.
+class RouteArray:
+    def __init__(self, nodes, offsets):
+        self.nodes = np.asarray(nodes, dtype=np.intp)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, r):
+        return self.nodes[self.offsets[r]:self.offsets[r+1]]
+
+    def tolist(self):
+        return [self[r].tolist() for r in range(len(self))]
+
+# Values of x as a dense array of the given shape, read in one call. x is an
+# MVar or a tupledict; for a tupledict pass its model m so the values come
+# from a single getAttr call.
+def solution_values(x, shape, m=None):
+    if not hasattr(x, "keys"):
+        return np.asarray(x.X).reshape(shape)
+    if m is not None:
+        values = m.getAttr("X", x)
+    else:
+        values = {key: var.X for key, var in x.items()}
+    vals = np.zeros(shape)
+    keys = np.array(list(values.keys()))
+    vals[tuple(keys.T)] = list(values.values())
+    return vals
+
+# Walk the O-D routes of one solution (vals[i, j] is the value of x[i, j]) in
+# linear time. Arcs count as used when their value is above threshold, which
+# absorbs solver tolerances like 0.9999999. Every location other than O and D
+# must be left exactly once and reached from O; otherwise (a location left
+# twice, a subtour, a route that never reaches D) a ValueError says where.
+# Routes that go straight from O to D are skipped. stops limits the check to
+# some locations (the ones a single vehicle serves).
+def extract_routes(vals, O, D, threshold=0.5, stops=None):
+    used = np.asarray(vals) > threshold
+    n = len(used)
+    used[D, :] = False
+    used[:, O] = False
+    if stops is None:
+        stops = [i for i in range(n) if i != O and i != D]
+    stops = np.asarray(stops, dtype=np.intp)
+    out_count = used[stops].sum(axis=1)
+    if np.any(out_count != 1):
+        bad = stops[out_count != 1]
+        raise ValueError(f"locations {bad.tolist()} are not left exactly once")
+    succ = np.full(n, -1, dtype=np.intp)
+    succ[stops] = used[stops].argmax(axis=1)
+
+    nodes = []
+    offsets = [0]
+    visited = np.zeros(n, dtype=bool)
+    for first in np.flatnonzero(used[O]):
+        if first == D:
+            continue
+        nodes.append(O)
+        i = first
+        while i != D:
+            if visited[i]:
+                raise ValueError(f"location {i} is reached twice")
+            visited[i] = True
+            nodes.append(i)
+            i = succ[i]
+        nodes.append(D)
+        offsets.append(len(nodes))
+    if not visited[stops].all():
+        cycle = stops[~visited[stops]]
+        raise ValueError(f"locations {cycle.tolist()} are on subtours that never reach the depot")
+    return RouteArray(nodes, offsets)
+
+# Routes from a solved two-index model, as lists [O, ..., D]
+def build_routes(x, N_LOCS, O, D, m=None):
+    vals = solution_values(x, (N_LOCS, N_LOCS), m)
+    return extract_routes(vals, O, D).tolist()
+
+# Same as build_routes for the three-index model: one route per vehicle k,
+# skipping vehicles that go straight from O to D
+def build_vehicle_routes(x, N_LOCS, K, O, D, m=None):
+    vals = solution_values(x, (N_LOCS, N_LOCS, K), m)
     routes = []
-    for i in range(1, N_LOCS):
-        if x[O, i].x == 1:
-            left = i
-            route = [O, i]
-            while left != D:
-                for right in range(1, N_LOCS):
-                    if x[left, right].x == 1:
-                        route.append(right)
-                        left = right
-                        break
-            routes.append(route)
+    for k in range(K):
+        used = vals[:, :, k] > 0.5
+        stops = [i for i in np.flatnonzero(used.any(axis=0) | used.any(axis=1)) if i != O and i != D]
+        routes += extract_routes(vals[:, :, k], O, D, stops=stops).tolist()
+    served = sorted(i for route in routes for i in route[1:-1])
+    if served != [i for i in range(N_LOCS) if i != O and i != D]:
+        raise ValueError("the vehicles do not serve every location exactly once")
     return routes
 
-def plot_all_routes(routes, locations):
-    fig, ax = plt.subplots()
-    ax.set_title("All Routes")
-
-    for route in routes:
-        route[-1] = 0
-        xs = [locations[i]["long"] for i in route]
-        ys = [locations[i]["lat"] for i in route]
-        ax.plot(xs, ys)
-    ax.axis('equal')
+# Plot every route in one figure. With filename the plot is written to that
+# file (no display needed) instead of shown.
+def plot_all_routes(routes, locations, filename=None):
+    if filename:
+        return render.render_routes(routes, locations, filename, "All Routes")
+    render.draw_figure(plt.figure(), routes, locations, "All Routes")
     plt.show()
 
 def split(a, n):
     k, m = divmod(len(a), n)
     return (a[i*k+min(i, m):(i+1)*k+min(i+1, m)] for i in range(n))
 
-def plot_4_groups_of_routes(routes, locations):
-    fig, axs = plt.subplots(2, 2, sharex=True, sharey=True)
-    route_groups = list(split(routes, 4))
-    fig.suptitle("4 Evenly Sized Groups of Routes")
-
-    for plot_i, routes in enumerate(route_groups):
-        for route in routes:
-            route[-1] = 0
-            xs = [locations[i]["long"] for i in route]
-            ys = [locations[i]["lat"] for i in route]
-            axs[plot_i % 2, plot_i // 2].plot(xs, ys)
+def plot_4_groups_of_routes(routes, locations, filename=None):
+    title = "4 Evenly Sized Groups of Routes"
+    if filename:
+        return render.render_routes(routes, locations, filename, title, groups=4)
+    render.draw_figure(plt.figure(), routes, locations, title, groups=4)
     plt.show()
 
 def print_routes(routes, demands):
@@ -144,3 +243,64 @@ def plot_subsets_and_depot(subsets, depot):
     plt.scatter(depot[0], depot[1])
     plt.axis('equal')
     plt.show()
+
+
+# STRATEGY 3
+# Split the locations into clusters that each carry at most max_demand
+# pallets and max_stops stops, measured in travel time rather than lat/long
+# (c is the cost matrix, demands from get_demands). This is a capacitated
+# k-medoids: stops are handed to the closest medoid that still has room,
+# most constrained stops (biggest gap between best and second best medoid)
+# first, then every medoid moves to the member closest to the rest of its
+# cluster. If some stop doesn't fit anywhere we retry with one more cluster.
+# Clusters come out about equally hard, so no single MIP dominates runtime.
+def get_subsets3(locations, c, demands, max_demand=60, max_stops=25, max_iter=20):
+    n = len(locations)
+    stops = np.arange(1, n)
+    t = np.asarray(c)[np.ix_(stops, stops)].astype(np.float64)
+    t = (t + t.T) / 2 # travel time either way
+    d = np.asarray(demands, dtype=np.float64)[stops]
+    if np.any(d > max_demand):
+        raise ValueError("a single stop needs more than max_demand pallets")
+
+    n_clusters = max(math.ceil(d.sum() / max_demand), math.ceil(len(stops) / max_stops))
+    while True:
+        labels = capacitated_kmedoids(t, d, n_clusters, max_demand, max_stops, max_iter)
+        if labels is not None:
+            break
+        n_clusters += 1
+
+    subsets = [stops[labels == k].tolist() for k in range(n_clusters)]
+    subsets = sorted(s for s in subsets if s)
+    return [[0] + r + [n] for r in subsets]
+
+def capacitated_kmedoids(t, d, n_clusters, max_demand, max_stops, max_iter):
+    # farthest-point seeds, starting from the stop farthest from all others
+    medoids = [int(np.argmax(t.sum(axis=1)))]
+    while len(medoids) < n_clusters:
+        medoids.append(int(np.argmax(t[:, medoids].min(axis=1))))
+
+    labels = None
+    for _ in range(max_iter):
+        dist = t[:, medoids]
+        ranked = np.sort(dist, axis=1)
+        regret = ranked[:, 1] - ranked[:, 0] if n_clusters > 1 else ranked[:, 0]
+        load = np.zeros(n_clusters)
+        count = np.zeros(n_clusters, dtype=int)
+        new_labels = np.full(len(d), -1)
+        for i in np.argsort(-regret, kind="stable"):
+            fits = (load + d[i] <= max_demand) & (count < max_stops)
+            if not fits.any():
+                return None
+            k = int(np.argmin(np.where(fits, dist[i], np.inf)))
+            new_labels[i] = k
+            load[k] += d[i]
+            count[k] += 1
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            members = np.flatnonzero(labels == k)
+            if len(members):
+                medoids[k] = int(members[np.argmin(t[np.ix_(members, members)].sum(axis=1))])
+    return labels